@@ -0,0 +1,55 @@
+# Named trade-offs between cost and quality, selectable per request.
+#   imgsz            detector input size (pixels, multiple of 32)
+#   conf             detector confidence threshold; the tracker's second association
+#                    pass only sees boxes above this, so keep it low for good tracks
+#   vehicle_classes  COCO classes treated as vehicles
+#   stride           frames between analyzed frames ('fixed' sampling, and the
+#                    starting stride for 'adaptive' sampling)
+#   min_stride, max_stride  bounds for 'adaptive' sampling
+#   render           draw annotations (annotated video / annotated live frame)
+ANALYSIS_PROFILES = {
+    'fast': {
+        'imgsz': 320,
+        'conf': 0.25,
+        'vehicle_classes': [2, 3, 5, 7],  # car, motorcycle, bus, truck
+        'stride': 20,
+        'min_stride': 10,
+        'max_stride': 60,
+        'render': False
+    },
+    'balanced': {
+        'imgsz': 640,
+        'conf': 0.1,
+        'vehicle_classes': [2, 3, 5, 7],
+        'stride': 10,
+        'min_stride': 3,
+        'max_stride': 30,
+        'render': True
+    },
+    'accurate': {
+        'imgsz': 960,
+        'conf': 0.1,
+        'vehicle_classes': [2, 3, 5, 7],
+        'stride': 5,
+        'min_stride': 2,
+        'max_stride': 15,
+        'render': True
+    }
+}
+
+DEFAULT_PROFILE = 'balanced'
+
+
+def get_profile(name=None, **overrides):
+    """Copy of the named profile (DEFAULT_PROFILE if name is None) including its name
+
+    Raises ValueError for unknown names.
+    """
+    name = name or DEFAULT_PROFILE
+    if name not in ANALYSIS_PROFILES:
+        raise ValueError(f"Unknown profile '{name}'. Choose one of: {', '.join(ANALYSIS_PROFILES)}")
+
+    profile = dict(ANALYSIS_PROFILES[name], name=name)
+    profile['vehicle_classes'] = list(profile['vehicle_classes'])
+    profile.update(overrides)
+    return profile
@@ -1,5 +1,6 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response
 from flask_cors import CORS
+from flask_sock import Sock
 import cv2
 import numpy as np
 import base64
@@ -10,19 +11,101 @@ import os
 import uuid
 from werkzeug.utils import secure_filename
 import tempfile
+import shutil
+import hashlib
+import inspect
+from functools import wraps
 
-from vehicle_detector import VehicleDetector
-from behavior_analyzer import BehaviorAnalyzer
-from ml_classifier import MLBehaviorClassifier
+from ml_classifier import MLBehaviorClassifier, PREDICTION_CHUNK_SIZE
+from job_queue import JobQueue
+from detector_pool import DetectorPool, DetectorBusyError
+from behavior_analyzer import BehaviorAnalyzer, VectorizedBehaviorAnalyzer
+from frame_sampler import FrameSampler, AdaptiveFrameSampler
+from video_pipeline import VideoPipeline
+from analysis_profiles import get_profile
+from result_cache import ResultCache
+from chunked_upload import UploadStore, UploadOffsetError, GrowingVideoCapture
+from box_interpolation import BoxInterpolator
+from hls_writer import HLSVideoWriter, find_ffmpeg, PLAYLIST_NAME
+from video_storage import VideoStorage
+from model_loader import ModelLoader
+from detection_cache import DetectionCache, ReplayMismatchError
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
 UPLOAD_FOLDER = 'uploads'
+ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm'}
+# Resumable uploads: total size limit, idle time before an unfinished upload is deleted, and
+# how much must arrive before processing can start early
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 2048))
+UPLOAD_EXPIRE_SECONDS = int(os.environ.get('UPLOAD_EXPIRE_SECONDS', 24 * 60 * 60))
+EARLY_START_BYTES = 2 * 1024 * 1024
+# Early processing gives up after waiting this long for the next chunk, freeing its worker and
+# detector; the upload stays resumable and is processed from the start once it is complete
+UPLOAD_STALL_SECONDS = int(os.environ.get('UPLOAD_STALL_SECONDS', 30))
 SAMPLE_VIDEOS_FOLDER = os.path.join(os.path.dirname(__file__), 'sample_videos')
 PROCESSED_VIDEOS_FOLDER = 'processed_videos'
+# Processed videos are deleted once unused for this long, least recently used first over the quota,
+# by a sweep every PROCESSED_VIDEOS_SWEEP_SECONDS
+PROCESSED_VIDEOS_TTL_SECONDS = int(os.environ.get('PROCESSED_VIDEOS_TTL_SECONDS', 2 * 60 * 60))
+PROCESSED_VIDEOS_MAX_MB = int(os.environ.get('PROCESSED_VIDEOS_MAX_MB', 5120))
+PROCESSED_VIDEOS_SWEEP_SECONDS = int(os.environ.get('PROCESSED_VIDEOS_SWEEP_SECONDS', 5 * 60))
+RESULT_CACHE_FOLDER = 'result_cache'
+RESULT_CACHE_MAX_MB = int(os.environ.get('RESULT_CACHE_MAX_MB', 1024))
+# Process the sample videos into the result cache once the models have loaded so the first click is instant
+PRECOMPUTE_SAMPLES = os.environ.get('PRECOMPUTE_SAMPLES', '1') == '1'
+SAMPLE_VIDEO_FILES = {
+    'highway_normal': 'approaching (2).MP4',
+    'city_intersection': 'approaching (5).MP4',
+    'aggressive_driving': 'change_lane (1).MP4'
+}
+# Each job holds one detector/analyzer pair, so the pool size bounds concurrent videos
+DETECTOR_POOL_SIZE = int(os.environ.get('DETECTOR_POOL_SIZE', 2))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', DETECTOR_POOL_SIZE))
+LIVE_SESSION_TIMEOUT = int(os.environ.get('LIVE_SESSION_TIMEOUT', 60))
+DETECTOR_WAIT_TIMEOUT = 30
+# Sampled frames per detector call when processing a video
+DETECTION_BATCH_SIZE = int(os.environ.get('DETECTION_BATCH_SIZE', 4))
+MAX_PENDING_JOBS = int(os.environ.get('MAX_PENDING_JOBS', 16))
+# 'adaptive' follows scene motion between the profile's min and max stride; 'fixed' uses its stride.
+# Vehicles are scored on a fixed frame grid, so both give comparable scores
+SAMPLING_MODE = os.environ.get('SAMPLING_MODE', 'adaptive')
+# 'vectorized' scores all vehicles of a frame in one NumPy pass; 'reference' is the per-vehicle analyzer
+ANALYZER_BACKEND = os.environ.get('ANALYZER_BACKEND', 'vectorized')
+# 'deferred' classifies every vehicle of a video in a few large calls once tracking is done;
+# 'batch' classifies each detection batch straight away. Annotated videos always use 'batch'.
+PREDICTION_MODE = os.environ.get('PREDICTION_MODE', 'deferred')
+# Set to 0 to run inference through sklearn instead of the compiled forest arrays
+COMPILED_INFERENCE = os.environ.get('COMPILED_INFERENCE', '1') != '0'
+# Detector runtime: 'pytorch', or a one-time CPU export run by 'onnx' (ONNX Runtime) or 'openvino'
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'pytorch')
+DETECTOR_INT8 = os.environ.get('DETECTOR_INT8', '0') == '1'
+# Vehicles unseen for this many analyzed frames, or seconds (live sessions), are evicted and summarized
+TRACK_TTL_FRAMES = int(os.environ.get('TRACK_TTL_FRAMES', 60))
+TRACK_TTL_SECONDS = int(os.environ.get('TRACK_TTL_SECONDS', 30))
+# How annotated videos draw boxes on frames between sampled ones: 'linear' between the sampled
+# positions (holds those frames until the next sampled one), 'velocity' extrapolated, or 'none'
+BOX_INTERPOLATION = os.environ.get('BOX_INTERPOLATION', 'linear')
+# Write annotated videos as HLS segments that can be played while processing runs (needs ffmpeg);
+# without ffmpeg, or with this set to 0, they are written as a single file when processing ends
+PROGRESSIVE_VIDEO = os.environ.get('PROGRESSIVE_VIDEO', '1') == '1'
+# Raw detections of processed videos are kept per detector model version, so analyzing a video again
+# (e.g. after tuning the analyzer or retraining the classifier) replays them instead of running the detector
+REPLAY_DETECTIONS = os.environ.get('REPLAY_DETECTIONS', '1') == '1'
+DETECTION_CACHE_FOLDER = 'detection_cache'
+DETECTION_CACHE_MAX_MB = int(os.environ.get('DETECTION_CACHE_MAX_MB', 512))
+
+# Streamed results are sent as newline-delimited JSON or Server-Sent Events
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+# Risk levels from lowest to highest
+RISK_LEVELS = ['SAFE', 'RISKY', 'DANGEROUS']
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -30,62 +113,325 @@ os.makedirs(SAMPLE_VIDEOS_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_VIDEOS_FOLDER, exist_ok=True)
 
 # Initialize components
-detector = VehicleDetector()
-analyzer = BehaviorAnalyzer()
-classifier = MLBehaviorClassifier()
+analyzer_class = BehaviorAnalyzer if ANALYZER_BACKEND == 'reference' else VectorizedBehaviorAnalyzer
+# Cached results are only reused while the analyzer code, thresholds included, is unchanged
+with open(inspect.getsourcefile(analyzer_class), 'rb') as f:
+    ANALYZER_VERSION = hashlib.sha256(f.read()).hexdigest()[:16]
+
+def create_detector():
+    # torch and ultralytics are only imported once the models are loaded in the background
+    from vehicle_detector import VehicleDetector
+    return VehicleDetector(track_ttl_frames=TRACK_TTL_FRAMES, backend=DETECTOR_BACKEND, int8=DETECTOR_INT8)
+
+detector_pool = DetectorPool(
+    size=DETECTOR_POOL_SIZE,
+    detector_factory=create_detector,
+    analyzer_factory=lambda: analyzer_class(track_ttl_frames=TRACK_TTL_FRAMES),
+    live_idle_timeout=LIVE_SESSION_TIMEOUT,
+    live_track_ttl_seconds=TRACK_TTL_SECONDS,
+    preload=False
+)
+classifier = MLBehaviorClassifier(use_compiled=COMPILED_INFERENCE)
+job_queue = JobQueue(max_workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS)
+result_cache = ResultCache(RESULT_CACHE_FOLDER, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+detection_cache = DetectionCache(DETECTION_CACHE_FOLDER, max_bytes=DETECTION_CACHE_MAX_MB * 1024 * 1024)
+upload_store = UploadStore(UPLOAD_FOLDER, expire_after=UPLOAD_EXPIRE_SECONDS, max_size=MAX_UPLOAD_MB * 1024 * 1024)
+video_storage = VideoStorage(PROCESSED_VIDEOS_FOLDER, ttl=PROCESSED_VIDEOS_TTL_SECONDS,
+                             max_bytes=PROCESSED_VIDEOS_MAX_MB * 1024 * 1024,
+                             sweep_interval=PROCESSED_VIDEOS_SWEEP_SECONDS)
+video_storage.start()
+
+def load_classifier():
+    """Load the behavior model, training one first if none has been saved"""
+    if os.path.exists('behavior_model.pkl'):
+        classifier.load_model()
+    else:
+        classifier.train_model()
+        classifier.save_model()
+    # First prediction builds lazily initialized state; pay for it now
+    classifier.predict_features(np.zeros((1, classifier.scaler.n_features_in_)))
+
+def warm_up_session(session):
+    """Run one inference so the first real frame does not pay for model initialization"""
+    profile = get_profile()
+    frame = np.zeros((profile['imgsz'], profile['imgsz'], 3), dtype=np.uint8)
+    session.detector.detect_vehicles(frame, imgsz=profile['imgsz'], conf=profile['conf'],
+                                     classes=profile['vehicle_classes'])
+    session.reset()
+
+# Models load in the background so the server can bind its port straight away
+startup = ModelLoader([
+    ('classifier', load_classifier),
+    ('detectors', lambda: detector_pool.fill(prepare=warm_up_session))
+])
 
-# Train or load the model
-if os.path.exists('behavior_model.pkl'):
-    classifier.load_model()
-else:
-    classifier.train_model()
-    classifier.save_model()
+def requires_models(route):
+    """Answer 503 instead of running route while the models are still loading"""
+    @wraps(route)
+    def wrapper(*args, **kwargs):
+        if not startup.ready:
+            return jsonify({
+                'error': 'ML models are still loading. Please try again in a moment.',
+                'status': 'models_loading' if startup.error is None else 'models_failed',
+                'startup': startup.status()
+            }), 503
+        return route(*args, **kwargs)
+    return wrapper
 
 @app.route('/health')
 def health_check():
-    return jsonify({'status': 'healthy', 'message': 'Vehicle Behavior Detector API is running'})
+    """Liveness: the server is up, whether or not the models have loaded"""
+    return jsonify({'status': 'healthy', 'message': 'Vehicle Behavior Detector API is running',
+                    'models': startup.state})
+
+@app.route('/ready')
+def readiness_check():
+    """Readiness: 200 once the models are loaded and warmed up, 503 until then"""
+    return jsonify(dict(startup.status(), ready=startup.ready)), 200 if startup.ready else 503
+
+def save_uploaded_video():
+    """Validate the uploaded video and its profile and save it to a temporary file
+    
+    Returns (temp_path, profile, None), or (None, None, error response) if the request is invalid.
+    """
+    if 'file' not in request.files:
+        return None, None, (jsonify({'error': 'No file uploaded'}), 400)
+    
+    file = request.files['file']
+    if file.filename == '':
+        return None, None, (jsonify({'error': 'No file selected'}), 400)
+    
+    # Validate file type
+    file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+    if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
+        return None, None, (jsonify({'error': 'Invalid file type. Please upload a video file.'}), 400)
+    
+    try:
+        profile = get_profile(request.values.get('profile'))
+    except ValueError as e:
+        return None, None, (jsonify({'error': str(e)}), 400)
+    
+    # Create a temporary file
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_extension}') as temp_file:
+        temp_path = temp_file.name
+        file.save(temp_path)
+    
+    return temp_path, profile, None
+
+def remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
 
 @app.route('/upload', methods=['POST'])
 def upload_video():
     """Process uploaded video file"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file uploaded'}), 400
+        temp_path, profile, error_response = save_uploaded_video()
+        if error_response:
+            return error_response
         
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        def remove_temp_file():
+            remove_file(temp_path)
         
-        # Validate file type
-        allowed_extensions = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm'}
-        file_extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-        if file_extension not in allowed_extensions:
+        # Process video in the background; the temporary file is removed once the job finishes
+        try:
+            job = job_queue.submit('upload', process_video_cached, temp_path, save_processed=profile['render'],
+                                   profile=profile, cleanup=remove_temp_file)
+        except RuntimeError as e:
+            remove_temp_file()
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify(dict(job.to_dict(), profile=profile)), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/uploads', methods=['POST'])
+def create_chunked_upload():
+    """Start a resumable upload
+    
+    JSON body: filename, optional size in bytes, optional profile, and
+    process_early to start processing while the rest of the file arrives. Send
+    the bytes with PATCH /uploads/<upload_id>, then POST /uploads/<upload_id>/complete.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = str(data.get('filename', ''))
+        file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
             return jsonify({'error': 'Invalid file type. Please upload a video file.'}), 400
         
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_extension}') as temp_file:
-            temp_path = temp_file.name
-            file.save(temp_path)
+        try:
+            profile = get_profile(data.get('profile'))
+            size = int(data['size']) if data.get('size') is not None else None
+            upload = upload_store.create(secure_filename(filename), file_extension, size,
+                                         options={'profile': profile, 'process_early': bool(data.get('process_early'))})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(dict(upload.to_dict(), profile=profile)), 201
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'HEAD'])
+def get_chunked_upload(upload_id):
+    """How many bytes of an upload have arrived, i.e. where to resume"""
+    upload = upload_store.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    response = jsonify(upload.to_dict())
+    response.headers['Upload-Offset'] = str(upload.offset)
+    return response
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def append_chunked_upload(upload_id):
+    """Append the request body to an upload; the Upload-Offset header must match its current offset"""
+    try:
+        upload = upload_store.get(upload_id)
+        if upload is None:
+            return jsonify({'error': 'Upload not found'}), 404
         
         try:
-            # Process video
-            results = process_video(temp_path, save_processed=True)
-            return jsonify(results)
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+        except ValueError:
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
+        
+        try:
+            upload.write_chunk(request.stream, offset, request.content_length)
+        except UploadOffsetError as e:
+            return jsonify({'error': str(e), 'offset': e.offset}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if upload.options.get('process_early') and upload.job_id is None:
+            start_early_processing(upload)
+        
+        response = jsonify(upload.to_dict())
+        response.headers['Upload-Offset'] = str(upload.offset)
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Finish an upload (optionally verifying its sha256) and process it, unless that already started"""
+    try:
+        upload = upload_store.get(upload_id)
+        if upload is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            sha256 = upload.complete(data.get('sha256'))
+        except UploadOffsetError as e:
+            return jsonify({'error': str(e), 'offset': e.offset}), 409
+        except ValueError as e:
+            upload_store.remove(upload_id)
+            return jsonify({'error': str(e)}), 422
+        
+        # Hashed while streaming, so the result cache does not read the file again
+        result_cache.remember_hash(upload.path, sha256)
+        
+        profile = upload.options['profile']
+        job = job_queue.get(upload.job_id) if upload.job_id is not None else None
+        if job is None or job.state == 'failed':
+            try:
+                job = job_queue.submit('upload', process_video_cached, upload.path, save_processed=profile['render'],
+                                       profile=profile, cleanup=lambda: upload_store.remove(upload_id))
+            except RuntimeError as e:
+                return jsonify({'error': str(e)}), 503
+            upload.job_id = job.id
+        
+        return jsonify(dict(job.to_dict(), sha256=sha256, profile=profile)), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def start_early_processing(upload):
+    """Queue processing of an upload that is still arriving, once OpenCV can read its header"""
+    if upload.offset < EARLY_START_BYTES:
+        return
+    probe = cv2.VideoCapture(upload.path)
+    readable = probe.isOpened() and probe.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+    probe.release()
+    if not readable:
+        return
+    
+    profile = upload.options['profile']
+    try:
+        job = job_queue.submit('upload', process_growing_upload, upload, profile)
+    except RuntimeError as e:
+        print(f"Could not start processing upload {upload.id} early: {e}")
+        return
+    upload.job_id = job.id
+    print(f"Started processing upload {upload.id} after {upload.offset} bytes")
+
+def process_growing_upload(upload, profile, progress_callback=None):
+    """Process an upload while its remaining chunks arrive, caching the result once it is complete
+
+    If processing fails, e.g. because the client stalled, the upload is left as it
+    is so the client can resume it, and completing it queues processing again.
+    """
+    try:
+        result = process_video(upload.path, save_processed=profile['render'], progress_callback=progress_callback,
+                               profile=profile, capture=GrowingVideoCapture(upload, UPLOAD_STALL_SECONDS))
+    except Exception:
+        upload.job_id = None
+        upload.options['process_early'] = False
+        raise
+    if upload.completed and os.path.exists(upload.path):
+        cache_key = result_cache.key(upload.path, analysis_config(profile, profile['render']))
+        result_cache.put(cache_key, result, result.get('processed_video_path'))
+    upload_store.remove(upload.id)
+    result['cached'] = False
+    return result
+
+@app.route('/upload/stream', methods=['POST'])
+@requires_models
+def upload_video_stream():
+    """Process an uploaded video, streaming each sampled frame's results as they are computed
+    
+    format=ndjson (default) sends one JSON object per line, format=sse sends
+    Server-Sent Events; the last record is the video summary.
+    """
+    try:
+        stream_format = request.values.get('format', 'ndjson')
+        if stream_format not in STREAM_FORMATS:
+            return jsonify({'error': f"Unknown stream format '{stream_format}'"}), 400
+        
+        temp_path, profile, error_response = save_uploaded_video()
+        if error_response:
+            return error_response
+        
+        try:
+            return stream_video(temp_path, profile, stream_format, cleanup=lambda: remove_file(temp_path))
+        except DetectorBusyError as e:
+            remove_file(temp_path)
+            return jsonify({'error': str(e)}), 503
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/process_frame', methods=['POST'])
+@requires_models
 def process_frame():
     """Process a single frame from webcam or video"""
     try:
         data = request.json
         if not data or 'image' not in data:
             return jsonify({'error': 'No image data provided'}), 400
+        
+        try:
+            profile = get_profile(data.get('profile'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 'overlay' returns only geometry for the client to draw instead of an annotated image
+        response_mode = data.get('mode', 'image')
+        if response_mode not in ('image', 'overlay'):
+            return jsonify({'error': f"Unknown response mode '{response_mode}'"}), 400
             
         image_data = data['image'].split(',')[1]  # Remove data:image/jpeg;base64,
         
@@ -95,50 +441,177 @@ def process_frame():
         frame = np.array(image)
         frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
         
-        # Detect vehicles
-        detections = detector.detect_vehicles(frame)
+        # Frames of one live session share a tracker; clients without an id share 'default'
+        session_id = str(data.get('session_id', 'default'))
+        with detector_pool.live_session(session_id, timeout=DETECTOR_WAIT_TIMEOUT) as session:
+            results, annotated_frame, overlay = analyze_live_frame(session, frame, profile,
+                                                                  overlay=response_mode == 'overlay')
         
-        # Analyze behavior
-        behaviors = analyzer.analyze_behavior(detections, frame.shape)
+        response = {
+            'detections': results,
+            'summary': generate_summary(results),
+            'profile': profile
+        }
+        if overlay is not None:
+            response['overlay'] = overlay
+        if annotated_frame is not None:
+            # Convert back to base64
+            _, buffer = cv2.imencode('.jpg', annotated_frame)
+            annotated_b64 = base64.b64encode(buffer).decode('utf-8')
+            response['annotated_image'] = f'data:image/jpeg;base64,{annotated_b64}'
         
-        # ML classification
-        ml_results = classifier.predict(behaviors)
+        return jsonify(response)
+    
+    except DetectorBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def analyze_live_frame(session, frame, profile, overlay=False):
+    """Detect, track and classify the vehicles of one live frame
+    
+    Returns (results, annotated_frame, overlay_data). With overlay set, overlay_data
+    holds the geometry needed to draw the annotations client-side and nothing is
+    drawn; otherwise annotated_frame is the annotated image if the profile renders.
+    Unused parts are None.
+    """
+    detector = session.detector
+    
+    # Detect vehicles
+    detections = detector.detect_vehicles(frame, imgsz=profile['imgsz'], conf=profile['conf'],
+                                          classes=profile['vehicle_classes'])
+    
+    # Analyze behavior
+    behaviors = session.analyzer.analyze_behavior(detections, frame.shape)
+    
+    # ML classification
+    ml_results = classifier.predict(behaviors)
+    
+    # Combine results
+    results = []
+    for vehicle_id in behaviors.keys():
+        vehicle_data = behaviors[vehicle_id]
+        ml_data = ml_results.get(vehicle_id, {})
         
-        # Combine results
-        results = []
-        for vehicle_id in behaviors.keys():
-            vehicle_data = behaviors[vehicle_id]
-            ml_data = ml_results.get(vehicle_id, {})
-            
-            results.append({
-                'id': vehicle_id,
-                'center': vehicle_data['center'],
-                'speed': round(vehicle_data['speed'], 2),
-                'acceleration': round(vehicle_data['acceleration'], 2) if vehicle_data['acceleration'] else 0,
-                'lane_changes': vehicle_data['lane_changes'],
-                'erratic_movements': vehicle_data['erratic_movements'],
-                'behavior_score': round(vehicle_data['behavior_score'], 2),
-                'risk_level': vehicle_data['risk_level'],
-                'ml_prediction': ml_data.get('prediction', 'UNKNOWN'),
-                'confidence': round(ml_data.get('confidence', 0) * 100, 1)
-            })
-        
-        # Draw annotations on frame
+        results.append({
+            'id': vehicle_id,
+            'center': vehicle_data['center'],
+            'speed': round(vehicle_data['speed'], 2),
+            'acceleration': round(vehicle_data['acceleration'], 2) if vehicle_data['acceleration'] else 0,
+            'lane_changes': vehicle_data['lane_changes'],
+            'erratic_movements': vehicle_data['erratic_movements'],
+            'behavior_score': round(vehicle_data['behavior_score'], 2),
+            'risk_level': vehicle_data['risk_level'],
+            'ml_prediction': ml_data.get('prediction', 'UNKNOWN'),
+            'confidence': round(ml_data.get('confidence', 0) * 100, 1)
+        })
+    
+    if overlay:
+        return results, None, build_overlay(detector, detections, results, frame.shape)
+    
+    # Draw annotations on frame
+    annotated_frame = None
+    if profile['render']:
         annotated_frame = detector.draw_detections(frame, detections)
         annotated_frame = draw_behavior_info(annotated_frame, results)
-        
-        # Convert back to base64
-        _, buffer = cv2.imencode('.jpg', annotated_frame)
-        annotated_b64 = base64.b64encode(buffer).decode('utf-8')
-        
-        return jsonify({
-            'annotated_image': f'data:image/jpeg;base64,{annotated_b64}',
-            'detections': results,
-            'summary': generate_summary(results)
+    
+    return results, annotated_frame, None
+
+def build_overlay(detector, detections, results, frame_shape):
+    """Boxes, trails and risk of each detected vehicle, everything draw_detections and
+    draw_behavior_info would put on the frame"""
+    results_by_id = {result['id']: result for result in results}
+    vehicles = []
+    for detection in detections:
+        result = results_by_id.get(detection['id'], {})
+        vehicles.append({
+            'id': detection['id'],
+            'bbox': list(detection['bbox']),
+            'class': detection['class'],
+            'trail': [list(point) for point in detection['trail']],
+            'risk_level': result.get('risk_level', 'SAFE'),
+            'behavior_score': result.get('behavior_score', 0),
+            'ml_prediction': result.get('ml_prediction', 'UNKNOWN'),
+            'confidence': result.get('confidence', 0)
         })
     
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return {
+        'width': frame_shape[1],
+        'height': frame_shape[0],
+        'vehicles': vehicles
+    }
+
+@sock.route('/live')
+def live_socket(ws):
+    """Live analysis over one WebSocket connection
+    
+    The client sends each frame as a binary message of JPEG (or PNG) bytes and gets
+    back a JSON text message with the detections and summary; when the profile
+    renders, a binary message with the annotated JPEG follows it; with mode=overlay
+    the reply carries overlay geometry instead and no image is sent. A text message
+    such as {"profile": "fast"} switches profile. The connection holds its own
+    detector/analyzer pair, so tracking state lives as long as the socket, and is
+    closed after LIVE_SESSION_TIMEOUT seconds without a message.
+    """
+    try:
+        profile = get_profile(request.args.get('profile'))
+    except ValueError as e:
+        ws.send(json.dumps({'error': str(e)}))
+        return
+    overlay = request.args.get('mode') == 'overlay'
+    if not startup.ready:
+        ws.send(json.dumps({'error': 'ML models are still loading. Please try again in a moment.',
+                            'status': 'models_loading'}))
+        return
+    
+    try:
+        session = detector_pool.acquire(timeout=DETECTOR_WAIT_TIMEOUT, live=True)
+    except DetectorBusyError as e:
+        ws.send(json.dumps({'error': str(e)}))
+        return
+    
+    try:
+        frame_number = 0
+        while True:
+            message = ws.receive(timeout=LIVE_SESSION_TIMEOUT)
+            if message is None:
+                break
+            
+            if isinstance(message, str):
+                try:
+                    profile = get_profile(json.loads(message).get('profile'))
+                    ws.send(json.dumps({'profile': profile}))
+                except ValueError as e:
+                    ws.send(json.dumps({'error': str(e)}))
+                continue
+            
+            frame = cv2.imdecode(np.frombuffer(message, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                ws.send(json.dumps({'error': 'Could not decode frame'}))
+                continue
+            
+            results, annotated_frame, overlay_data = analyze_live_frame(session, frame, profile, overlay)
+            reply = {
+                'frame': frame_number,
+                'detections': results,
+                'summary': generate_summary(results)
+            }
+            if overlay_data is not None:
+                reply['overlay'] = overlay_data
+            ws.send(json.dumps(reply, default=str))
+            if annotated_frame is not None:
+                _, buffer = cv2.imencode('.jpg', annotated_frame)
+                ws.send(buffer.tobytes())
+            frame_number += 1
+    finally:
+        detector_pool.release(session)
+
+@app.route('/end_session/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    """Release the detector held by a live session (called when the user stops live mode)"""
+    if detector_pool.end_live_session(session_id):
+        return jsonify({'message': 'Session ended', 'status': 'success'})
+    return jsonify({'message': 'Session not found', 'status': 'not_found'}), 404
 
 @app.route('/sample_videos')
 def get_sample_videos():
@@ -171,37 +644,160 @@ def get_sample_videos():
     ]
     return jsonify(sample_videos)
 
+def resolve_sample_video(video_id):
+    """Path and profile of a sample video request
+    
+    Returns (video_path, profile, None), or (None, None, error response) if the request is invalid.
+    """
+    if video_id not in SAMPLE_VIDEO_FILES:
+        return None, None, (jsonify({'error': 'Sample video not found'}), 404)
+    
+    video_path = os.path.join(SAMPLE_VIDEOS_FOLDER, SAMPLE_VIDEO_FILES[video_id])
+    
+    # Check if video file exists
+    if not os.path.exists(video_path):
+        return None, None, (jsonify({'error': f'Video file not found: {SAMPLE_VIDEO_FILES[video_id]}. Please add your dashcam videos to the sample_videos folder.'}), 404)
+    
+    # Samples show a pre-processed demo video unless a rendering profile is asked for
+    profile_name = request.values.get('profile') or (request.get_json(silent=True) or {}).get('profile')
+    try:
+        profile = get_profile(profile_name) if profile_name else get_profile(render=False)
+    except ValueError as e:
+        return None, None, (jsonify({'error': str(e)}), 400)
+    
+    return video_path, profile, None
+
 @app.route('/process_sample/<video_id>', methods=['POST'])
 def process_sample_video(video_id):
     """Process a sample video with pre-processed demo videos"""
     try:
-        # Map video IDs to actual file names and demo video IDs
-        video_files = {
-            'highway_normal': 'approaching (2).MP4',
-            'city_intersection': 'approaching (5).MP4', 
-            'aggressive_driving': 'change_lane (1).MP4'
-        }
-        
-        if video_id not in video_files:
-            return jsonify({'error': 'Sample video not found'}), 404
+        video_path, profile, error_response = resolve_sample_video(video_id)
+        if error_response:
+            return error_response
         
-        video_path = os.path.join(SAMPLE_VIDEOS_FOLDER, video_files[video_id])
-        
-        # Check if video file exists
-        if not os.path.exists(video_path):
-            return jsonify({'error': f'Video file not found: {video_files[video_id]}. Please add your dashcam videos to the sample_videos folder.'}), 404
+        # Process the actual video for analysis in the background
+        try:
+            job = job_queue.submit('sample', process_sample_file, video_path, video_id, profile=profile)
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 503
         
-        # Process the actual video for analysis, but use demo video_id for display
-        results = process_video(video_path, save_processed=False)
+        return jsonify(dict(job.to_dict(), profile=profile)), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/process_sample/<video_id>/stream', methods=['POST'])
+@requires_models
+def process_sample_video_stream(video_id):
+    """Process a sample video, streaming results like /upload/stream"""
+    try:
+        stream_format = request.values.get('format', 'ndjson')
+        if stream_format not in STREAM_FORMATS:
+            return jsonify({'error': f"Unknown stream format '{stream_format}'"}), 400
         
-        # Add a demo video_id for sample videos (these will point to pre-processed demo videos)
-        results['video_id'] = f'demo_{video_id}'
+        video_path, profile, error_response = resolve_sample_video(video_id)
+        if error_response:
+            return error_response
         
-        return jsonify(results)
+        try:
+            return stream_video(video_path, profile, stream_format, demo_video_id=f'demo_{video_id}')
+        except DetectorBusyError as e:
+            return jsonify({'error': str(e)}), 503
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def stream_video(video_path, profile, stream_format, cleanup=None, demo_video_id=None):
+    """Streaming response with a video's frame records followed by its summary
+    
+    Cached results are replayed straight away. Otherwise a detector pair is taken
+    from the pool before the response starts (raising DetectorBusyError if none
+    frees up) and returned, and cleanup called, once the response is closed, even
+    if the client disconnects early.
+    """
+    save_processed = profile['render']
+    _, cached = get_cached_result(video_path, profile, save_processed)
+    if cached is not None:
+        records = replay_video_records(cached)
+        session = None
+    else:
+        session = detector_pool.acquire(timeout=DETECTOR_WAIT_TIMEOUT)
+        records = iter_video_records(video_path, save_processed, session=session, profile=profile, stream=True)
+    
+    def generate():
+        try:
+            for record in records:
+                if record.get('type') == 'summary' and demo_video_id and 'video_id' not in record:
+                    record['video_id'] = demo_video_id
+                yield format_stream_record(record, stream_format)
+        except Exception as e:
+            yield format_stream_record({'type': 'error', 'error': str(e)}, stream_format)
+        finally:
+            # Stop the pipeline threads before the detector pair goes back to the pool
+            records.close()
+    
+    def close():
+        if session is not None:
+            detector_pool.release(session)
+        if cleanup is not None:
+            cleanup()
+    
+    response = Response(generate(), mimetype=STREAM_FORMATS[stream_format])
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(close)
+    return response
+
+def replay_video_records(result):
+    """Frame and summary records of a cached (non-streamed) process_video result"""
+    frame_results = {}
+    for frame_result in result['results']:
+        frame_results.setdefault(frame_result['frame'], []).append(frame_result)
+    
+    for frame_idx, results in frame_results.items():
+        yield {'type': 'frame', 'frame': frame_idx, 'total_frames': result['total_frames'], 'results': results}
+    
+    summary = {key: value for key, value in result.items() if key != 'results'}
+    summary['type'] = 'summary'
+    yield summary
+
+def format_stream_record(record, stream_format):
+    data = json.dumps(record, default=str)
+    if stream_format == 'sse':
+        return f"event: {record.get('type', 'message')}\ndata: {data}\n\n"
+    return data + '\n'
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Report state, progress and result of a background processing job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs')
+def get_job_stats():
+    """Report worker pool size, job counts by state and detector usage"""
+    stats = job_queue.stats()
+    stats['detectors'] = detector_pool.stats()
+    stats['result_cache'] = result_cache.stats()
+    stats['detection_cache'] = detection_cache.stats()
+    stats['processed_videos'] = video_storage.stats()
+    stats['startup'] = startup.status()
+    return jsonify(stats)
+
+def process_sample_file(video_path, video_id, progress_callback=None, profile=None):
+    """Process a sample video, using the demo video_id for display unless the profile renders"""
+    profile = profile or get_profile(render=False)
+    results = process_video_cached(video_path, save_processed=profile['render'],
+                                   progress_callback=progress_callback, profile=profile)
+    
+    # Add a demo video_id for sample videos (these will point to pre-processed demo videos)
+    if 'video_id' not in results:
+        results['video_id'] = f'demo_{video_id}'
+    return results
+
 @app.route('/processed_video/<video_id>')
 def get_processed_video(video_id):
     """Serve processed video file"""
@@ -221,38 +817,44 @@ def get_processed_video(video_id):
                     return send_file(demo_path, mimetype='video/mp4')
                 else:
                     # Fallback to original video if demo doesn't exist
-                    original_files = {
-                        'highway_normal': 'approaching (2).MP4',
-                        'city_intersection': 'approaching (5).MP4', 
-                        'aggressive_driving': 'change_lane (1).MP4'
-                    }
-                    original_path = os.path.join(SAMPLE_VIDEOS_FOLDER, original_files[demo_id])
+                    original_path = os.path.join(SAMPLE_VIDEOS_FOLDER, SAMPLE_VIDEO_FILES[demo_id])
                     if os.path.exists(original_path):
                         return send_file(original_path, mimetype='video/mp4')
         
-        # Handle regular processed videos
-        video_path = os.path.join(PROCESSED_VIDEOS_FOLDER, f'processed_{video_id}.mp4')
-        if os.path.exists(video_path):
-            return send_file(video_path, mimetype='video/mp4')
-        
-        # Try .avi extension as fallback
-        video_path_avi = os.path.join(PROCESSED_VIDEOS_FOLDER, f'processed_{video_id}.avi')
-        if os.path.exists(video_path_avi):
-            return send_file(video_path_avi, mimetype='video/avi')
+        # Handle regular processed videos (.mp4, or .avi when written with the MJPG fallback)
+        video_path = video_storage.find(video_id)
+        if video_path is not None:
+            video_storage.touch(video_id)
+            return send_file(video_path, mimetype='video/mp4' if video_path.endswith('.mp4') else 'video/avi')
         
         return jsonify({'error': 'Processed video not found'}), 404
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/processed_video/<video_id>/<filename>')
+def get_processed_video_segment(video_id, filename):
+    """Serve the HLS playlist or a segment of a processed video, available while it is being written"""
+    directory = os.path.abspath(hls_directory(video_id))
+    if not os.path.isfile(os.path.join(directory, filename)):
+        return jsonify({'error': 'Segment not found'}), 404
+    
+    if filename == PLAYLIST_NAME:
+        video_storage.touch(video_id)
+        response = send_from_directory(directory, filename, mimetype='application/vnd.apple.mpegurl')
+        # The playlist grows as segments are finished
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return send_from_directory(directory, filename, mimetype='video/mp4', max_age=24 * 60 * 60)
+
+def hls_directory(video_id):
+    return os.path.join(PROCESSED_VIDEOS_FOLDER, f'hls_{secure_filename(video_id)}')
+
 @app.route('/cleanup_video/<video_id>', methods=['DELETE'])
 def cleanup_video(video_id):
     """Delete a processed video (called when user leaves session)"""
     try:
-        video_path = os.path.join(PROCESSED_VIDEOS_FOLDER, f'processed_{video_id}.mp4')
-        
-        if os.path.exists(video_path):
-            os.remove(video_path)
+        if video_storage.remove(video_id):
             return jsonify({'message': 'Video cleaned up successfully', 'status': 'success'})
         else:
             return jsonify({'message': 'Video not found', 'status': 'not_found'}), 404
@@ -261,28 +863,146 @@ def cleanup_video(video_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/retrain_model', methods=['POST'])
+@requires_models
 def retrain_model():
-    """Retrain the ML model with accumulated real data"""
+    """Queue retraining of the ML model on the real data collected since it was trained
+    
+    Runs as a background job (poll /jobs/<job_id>) that grows the forest with the
+    new samples only; pass full=true to retrain on all data. The current model
+    keeps serving until the new one is ready.
+    """
     try:
-        # Retrain with real data
-        accuracy = classifier.train_model(use_real_data=True)
+        data = request.get_json(silent=True) or {}
+        full = str(data.get('full', request.args.get('full', 'false'))).lower() in ('1', 'true')
+        if classifier.training_lock.locked():
+            return jsonify({'error': 'Retraining is already running'}), 409
         
-        # Save the updated model
-        classifier.save_model()
-        
-        return jsonify({
-            'message': 'Model retrained successfully',
-            'accuracy': accuracy,
-            'status': 'success'
-        })
+        try:
+            job = job_queue.submit('retrain', classifier.retrain, full=full)
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 503
+        return jsonify(job.to_dict()), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def process_video(video_path, save_processed=False):
-    """Process entire video file"""
+def process_video_cached(video_path, save_processed=False, progress_callback=None, profile=None):
+    """process_video through the result cache, keyed by the video's content and analysis settings"""
+    profile = profile or get_profile()
+    cache_key, result = get_cached_result(video_path, profile, save_processed)
+    if result is not None:
+        return result
+    
+    result = process_video(video_path, save_processed, progress_callback, profile=profile)
+    result_cache.put(cache_key, result, result.get('processed_video_path'))
+    result['cached'] = False
+    return result
+
+def get_cached_result(video_path, profile, save_processed):
+    """(cache key, cached process_video result or None) for a video and its analysis settings"""
+    # The key includes the model version, so queued jobs wait for the models
+    startup.wait()
+    cache_key = result_cache.key(video_path, analysis_config(profile, save_processed))
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        result, cached_video_path = cached
+        if cached_video_path:
+            # Clients delete processed videos when they are done, so hand out a fresh copy
+            video_id = str(uuid.uuid4())
+            extension = os.path.splitext(cached_video_path)[1]
+            processed_video_path = os.path.join(PROCESSED_VIDEOS_FOLDER, f'processed_{video_id}{extension}')
+            shutil.copyfile(cached_video_path, processed_video_path)
+            result['processed_video_path'] = processed_video_path
+            result['video_id'] = video_id
+            # Only the joined video is cached, not the segments
+            result.pop('playlist', None)
+        print(f"Serving cached result for {video_path}")
+        result['cached'] = True
+        return cache_key, result
+    return cache_key, None
+
+def analysis_config(profile, save_processed):
+    """Everything besides the video itself that changes a process_video result"""
+    return {
+        'profile': profile,
+        'save_processed': save_processed,
+        'sampling_mode': SAMPLING_MODE,
+        'analyzer': ANALYZER_BACKEND,
+        'analyzer_version': ANALYZER_VERSION,
+        'detector': DETECTOR_BACKEND,
+        'detector_int8': DETECTOR_INT8,
+        'box_interpolation': BOX_INTERPOLATION,
+        'model_version': classifier.version
+    }
+
+def detection_config(detector, profile, save_processed):
+    """Everything besides the video itself that changes the detections of a process_video run"""
+    return {
+        'model_version': detector.model_version,
+        'imgsz': profile['imgsz'],
+        'conf': profile['conf'],
+        'vehicle_classes': profile['vehicle_classes'],
+        'sampling_mode': SAMPLING_MODE,
+        'stride': profile['stride'],
+        'min_stride': profile['min_stride'],
+        'max_stride': profile['max_stride'],
+        # Decoding every frame instead of seeking can change which frames adaptive sampling picks
+        'decode_all': save_processed
+    }
+
+def precompute_sample_results():
+    """Queue every available sample video so its result is cached before anyone asks for it"""
+    for video_id, filename in SAMPLE_VIDEO_FILES.items():
+        video_path = os.path.join(SAMPLE_VIDEOS_FOLDER, filename)
+        if not os.path.exists(video_path):
+            continue
+        try:
+            job_queue.submit('precompute', process_sample_file, video_path, video_id)
+        except RuntimeError as e:
+            print(f"Could not queue sample {video_id} for precomputing: {e}")
+
+def process_video(video_path, save_processed=False, progress_callback=None, session=None,
+                  batch_size=DETECTION_BATCH_SIZE, profile=None, capture=None):
+    """Process entire video file, reporting (frames_done, total_frames) to progress_callback
+
+    The video holds one detector/analyzer pair from the pool for its whole duration
+    so tracks are never mixed with another video. Sampled frames are sent to the
+    detector batch_size at a time, and decoding, detection and encoding overlap.
+    profile (see analysis_profiles) sets the detector input size, thresholds and stride.
+    capture replaces opening video_path with cv2.VideoCapture, e.g. for a video still uploading.
+    """
+    for result_data in iter_video_records(video_path, save_processed, progress_callback, session, batch_size,
+                                          profile, capture=capture):
+        pass
+    return result_data
+
+def iter_video_records(video_path, save_processed=False, progress_callback=None, session=None,
+                       batch_size=DETECTION_BATCH_SIZE, profile=None, stream=False, capture=None,
+                       replay=True):
+    """Generator behind process_video that yields the result data once the video is done
+
+    With stream set it first yields a {'type': 'frame'} record with each sampled
+    frame's results as soon as they are computed, and the final record is tagged
+    'type': 'summary' and leaves out the per-frame results, which are not kept.
+    If replayed detections turn out not to fit the video, they are discarded and
+    the video is processed again with the detector; a stream then gets a
+    {'type': 'restart'} record before the records start over.
+    """
+    if session is None:
+        startup.wait()
+        with detector_pool.session() as session:
+            yield from iter_video_records(video_path, save_processed, progress_callback, session, batch_size,
+                                          profile, stream, capture, replay)
+        return
+    
+    if profile is None:
+        profile = get_profile()
+    
+    video_id = None
+    detector = session.detector
+    replay_mismatch = None
     try:
-        cap = cv2.VideoCapture(video_path)
+        cap = capture if capture is not None else cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise ValueError("Could not open video file")
             
@@ -292,21 +1012,34 @@ def process_video(video_path, save_processed=False):
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
         all_results = []
+        vehicle_risks = {}
         processed_video_path = None
-        video_id = None
         out = None
         
+        playlist_url = None
+        
         # Setup video writer if saving processed video
         if save_processed:
             video_id = str(uuid.uuid4())
+            # Keep the storage sweep away from the video while it is written
+            video_storage.pin(video_id)
             processed_video_path = os.path.join(PROCESSED_VIDEOS_FOLDER, f'processed_{video_id}.mp4')
             print(f"Attempting to create processed video: {processed_video_path}")
             print(f"Video properties: {width}x{height} @ {fps} fps")
             
+            # Segments playable while processing, joined into processed_video_path at the end
+            if PROGRESSIVE_VIDEO and find_ffmpeg():
+                out = HLSVideoWriter(hls_directory(video_id), processed_video_path, fps, (width, height))
+                if out.isOpened():
+                    playlist_url = f'/processed_video/{video_id}/{PLAYLIST_NAME}'
+                else:
+                    print("ffmpeg HLS writer failed, falling back to OpenCV")
+            
             # Try different codecs for better compatibility  
             # Try mp4v first, then fall back to MJPG if that fails
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(processed_video_path, fourcc, fps, (width, height))
+            if playlist_url is None:
+                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+                out = cv2.VideoWriter(processed_video_path, fourcc, fps, (width, height))
             
             # If mp4v fails, try MJPG codec
             if not out.isOpened():
@@ -323,63 +1056,100 @@ def process_video(video_path, save_processed=False):
             else:
                 print(f"Video writer created successfully")
         
-        frame_idx = 0
+        if playlist_url is not None:
+            # Let clients start playing before the video is done
+            if progress_callback is not None:
+                progress_callback(0, frame_count, video_id=video_id, playlist=playlist_url)
+            if stream:
+                yield {'type': 'video', 'video_id': video_id, 'playlist': playlist_url}
+        
+        # A video detected with the same settings before replays its recorded detections;
+        # otherwise they are recorded. Videos still uploading have no content hash yet.
+        detection_key = None
+        if REPLAY_DETECTIONS and capture is None:
+            detection_key = detection_cache.key(result_cache.file_hash(video_path),
+                                                detection_config(detector, profile, save_processed))
+            recorded_frames = detection_cache.get(detection_key) if replay else None
+            if recorded_frames is not None:
+                from vehicle_detector import ReplayDetector
+                detector = ReplayDetector(recorded_frames, session.detector.model_version, TRACK_TTL_FRAMES)
+                print(f"Replaying recorded detections of {len(recorded_frames)} frames for {video_path}")
+            else:
+                detector.start_recording()
+        
         processed_frames = 0
+        # Draws every written frame, moving boxes between the sampled frames
+        interpolator = None
+        if out is not None:
+            interpolator = BoxInterpolator(
+                lambda frame, detections, results, trails: annotate_frame(detector, frame, detections,
+                                                                           results, trails),
+                BOX_INTERPOLATION
+            )
+        # Per-vehicle summaries, emitted as each vehicle leaves the scene
+        vehicle_summaries = []
+        session.analyzer.on_track_evicted = vehicle_summaries.append
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Process every 10th frame for performance
-            annotated_frame = frame.copy()
-            if frame_idx % 10 == 0:
-                try:
-                    detections = detector.detect_vehicles(frame)
-                    behaviors = analyzer.analyze_behavior(detections, frame.shape)
-                    ml_results = classifier.predict(behaviors)
-                    
-                    # Save behavior data for training
-                    if behaviors:
-                        classifier.save_training_data(behaviors)
-                    
-                    frame_results = []
-                    for vehicle_id in behaviors.keys():
-                        vehicle_data = behaviors[vehicle_id]
-                        ml_data = ml_results.get(vehicle_id, {})
-                        
-                        frame_results.append({
-                            'frame': frame_idx,
-                            'id': vehicle_id,
-                            'center': vehicle_data['center'],
-                            'speed': round(vehicle_data['speed'], 2),
-                            'acceleration': round(vehicle_data['acceleration'], 2) if vehicle_data['acceleration'] else 0,
-                            'lane_changes': vehicle_data['lane_changes'],
-                            'erratic_movements': vehicle_data['erratic_movements'],
-                            'behavior_score': round(vehicle_data['behavior_score'], 2),
-                            'risk_level': vehicle_data['risk_level'],
-                            'ml_prediction': ml_data.get('prediction', 'UNKNOWN'),
-                            'confidence': round(ml_data.get('confidence', 0) * 100, 1)
-                        })
-                    
-                    # Draw annotations if we have detections
-                    if detections:
-                        annotated_frame = detector.draw_detections(frame, detections)
-                        annotated_frame = draw_behavior_info(annotated_frame, frame_results)
-                    
-                    all_results.extend(frame_results)
-                    processed_frames += 1
-                except Exception as e:
-                    print(f"Error processing frame {frame_idx}: {e}")
-                    continue
-            
-            # Write frame to output video if saving
-            if save_processed and out is not None:
-                out.write(annotated_frame)
+        # Only sampled frames are analyzed; the others are only decoded when writing.
+        # Decoding and detection run on their own threads while this loop annotates and encodes.
+        sampler = create_frame_sampler(cap, profile, decode_all=save_processed)
+        # Drawing and streaming need each frame's predictions straight away, so only defer otherwise
+        defer_predictions = PREDICTION_MODE == 'deferred' and out is None and not stream
+        deferred_features = []
+        pipeline = VideoPipeline(
+            sampler,
+            lambda batch: analyze_frame_batch(session, batch, profile, draw=out is not None,
+                                              defer_predictions=defer_predictions, detector=detector),
+            batch_size=batch_size
+        )
+        for frame_idx, frame, analysis in pipeline:
+            if analysis is not None:
+                update_vehicle_risks(vehicle_risks, analysis['results'])
+                if not stream:
+                    all_results.extend(analysis['results'])
+                if 'features' in analysis:
+                    deferred_features.append(analysis['features'])
+                processed_frames += 1
+                
+                if progress_callback is not None:
+                    progress_callback(frame_idx + 1, frame_count)
+                if stream:
+                    yield {
+                        'type': 'frame',
+                        'frame': frame_idx,
+                        'total_frames': frame_count,
+                        'results': analysis['results']
+                    }
             
-            frame_idx += 1
+            # Write frames to output video if saving, annotated once their boxes are known
+            if interpolator is not None:
+                for ready_frame in interpolator.push(frame_idx, frame, analysis):
+                    out.write(ready_frame)
         
+        if interpolator is not None:
+            for ready_frame in interpolator.flush():
+                out.write(ready_frame)
         cap.release()
+        sampled_frames = sampler.stats()['sampled_frames']
+        if detector is not session.detector and len(detector.replay_frames) != sampled_frames:
+            # The recording does not fit how the video was sampled; drop it and the video written from it
+            detection_cache.remove(detection_key)
+            if out is not None:
+                out.release()
+                video_storage.remove(video_id)
+            raise ReplayMismatchError(f"Recorded detections cover {len(detector.replay_frames)} frames, "
+                                      f"but {sampled_frames} were sampled")
+        if detector.recorded_frames is not None:
+            recorded_frames = detector.stop_recording()
+            # A failed detector call leaves a gap that would shift every later frame of a replay
+            if len(recorded_frames) == sampled_frames:
+                detection_cache.put(detection_key, recorded_frames)
+        session.analyzer.evict_all()
+        if deferred_features:
+            apply_predictions(all_results, np.vstack(deferred_features), chunk_size=PREDICTION_CHUNK_SIZE)
+        classifier.flush_training_data()
+        if progress_callback is not None:
+            progress_callback(sampler.frames_read, frame_count)
         if save_processed and out is not None and processed_video_path:
             out.release()
             print(f"Video writer released. Checking if file exists: {processed_video_path}")
@@ -388,25 +1158,156 @@ def process_video(video_path, save_processed=False):
                 print(f"Processed video saved successfully: {file_size} bytes")
             else:
                 print(f"Error: Processed video file was not created")
+            video_storage.unpin(video_id)
+            # Make room for the new video right away instead of waiting for the next sweep
+            video_storage.sweep()
         
         result_data = {
             'total_frames': frame_count,
             'processed_frames': processed_frames,
+            'profile': profile,
+            'sampling': sampler.stats(),
             'results': all_results,
-            'summary': generate_video_summary(all_results)
+            'vehicles': sorted(vehicle_summaries, key=lambda vehicle: vehicle['first_frame']),
+            'summary': summarize_vehicle_risks(vehicle_risks)
         }
         
         if save_processed and processed_video_path and os.path.exists(processed_video_path):
             result_data['processed_video_path'] = processed_video_path
             result_data['video_id'] = video_id
+            if playlist_url is not None:
+                result_data['playlist'] = playlist_url
             print(f"Including video_id in response: {video_id}")
         else:
             print("Video not saved successfully, excluding video_id from response")
         
-        return result_data
+        if stream:
+            del result_data['results']
+            result_data['type'] = 'summary'
+        yield result_data
     
+    except ReplayMismatchError as e:
+        replay_mismatch = e
     except Exception as e:
         raise Exception(f"Video processing failed: {str(e)}")
+    finally:
+        session.analyzer.on_track_evicted = None
+        session.detector.stop_recording()
+        if video_id is not None:
+            video_storage.unpin(video_id)
+    
+    if replay_mismatch is not None:
+        print(f"{replay_mismatch}; detecting {video_path} again")
+        session.reset()
+        if stream:
+            yield {'type': 'restart', 'reason': str(replay_mismatch)}
+        yield from iter_video_records(video_path, save_processed, progress_callback, session, batch_size,
+                                      profile, stream, capture, replay=False)
+
+def create_frame_sampler(cap, profile, decode_all=False):
+    """Frame sampler configured by SAMPLING_MODE and the profile's strides"""
+    if SAMPLING_MODE == 'fixed':
+        return FrameSampler(cap, stride=profile['stride'], decode_all=decode_all)
+    return AdaptiveFrameSampler(cap, min_stride=profile['min_stride'], max_stride=profile['max_stride'],
+                                initial_stride=profile['stride'], decode_all=decode_all)
+
+def analyze_frame_batch(session, batch, profile, draw=False, defer_predictions=False, detector=None):
+    """Detect and analyze the sampled frames of a batch of (frame_idx, frame, sampled) entries
+
+    Only sampled frames go through the detector, in a single batched call, and all
+    vehicles of the batch are classified with one classifier call. Returns a
+    (frame_idx, frame, analysis) entry per input entry, in order, where analysis is
+    None for frames that were not analyzed. With draw set, each analysis also holds
+    the track trails as they were when its frame was tracked, so it can be
+    annotated after later frames of the batch have been tracked. With defer_predictions set, results are left unclassified
+    and each analysis carries the feature rows for the caller to classify later.
+    detector replaces the session's detector, e.g. with a ReplayDetector.
+    """
+    detector = detector or session.detector
+    analyzer = session.analyzer
+    sampled_frames = [frame for _, frame, sampled in batch if sampled]
+    
+    try:
+        batch_detections = iter(detector.detect_vehicles_batch(sampled_frames, imgsz=profile['imgsz'],
+                                                               conf=profile['conf'],
+                                                               classes=profile['vehicle_classes']))
+    except Exception as e:
+        print(f"Error detecting vehicles in frames {batch[0][0]}-{batch[-1][0]}: {e}")
+        batch_detections = None
+    
+    analyzed_batch = []
+    batch_results = []
+    batch_features = []
+    for frame_idx, frame, sampled in batch:
+        analysis = None
+        if sampled and batch_detections is not None:
+            try:
+                detections = next(batch_detections)
+                behaviors = analyzer.analyze_behavior(detections, frame.shape, frame_idx)
+                
+                # Save behavior data for training
+                if behaviors:
+                    classifier.save_training_data(behaviors)
+                
+                frame_results = []
+                for vehicle_id in behaviors.keys():
+                    vehicle_data = behaviors[vehicle_id]
+                    
+                    frame_results.append({
+                        'frame': frame_idx,
+                        'id': vehicle_id,
+                        'center': vehicle_data['center'],
+                        'speed': round(vehicle_data['speed'], 2),
+                        'acceleration': round(vehicle_data['acceleration'], 2) if vehicle_data['acceleration'] else 0,
+                        'lane_changes': vehicle_data['lane_changes'],
+                        'erratic_movements': vehicle_data['erratic_movements'],
+                        'behavior_score': round(vehicle_data['behavior_score'], 2),
+                        'risk_level': vehicle_data['risk_level']
+                    })
+                
+                analysis = {
+                    'detections': detections,
+                    'results': frame_results,
+                    'trails': {d['id']: d['trail'] for d in detections} if draw else None
+                }
+                if frame_results:
+                    features = classifier.extract_features(behaviors)
+                    if defer_predictions:
+                        analysis['features'] = features
+                    else:
+                        batch_results.extend(frame_results)
+                        batch_features.append(features)
+            except Exception as e:
+                print(f"Error processing frame {frame_idx}: {e}")
+        
+        analyzed_batch.append((frame_idx, frame, analysis))
+    
+    if batch_features:
+        apply_predictions(batch_results, np.vstack(batch_features))
+    
+    return analyzed_batch
+
+def apply_predictions(results, features, chunk_size=None):
+    """Fill in ml_prediction and confidence of results from their feature rows"""
+    try:
+        predictions, probabilities = classifier.predict_features(features, chunk_size=chunk_size)
+    except Exception as e:
+        print(f"Error classifying {len(results)} vehicles: {e}")
+        for result in results:
+            result['ml_prediction'] = 'UNKNOWN'
+            result['confidence'] = 0
+        return
+    
+    for result, prediction, probability in zip(results, predictions, probabilities):
+        result['ml_prediction'] = prediction
+        result['confidence'] = round(max(probability) * 100, 1)
+
+def annotate_frame(detector, frame, detections, results, trails=None):
+    """Draw boxes, trails and behavior information of a frame's vehicles"""
+    if not detections:
+        return frame
+    frame = detector.draw_detections(frame, detections, trails)
+    return draw_behavior_info(frame, results)
 
 def draw_behavior_info(frame, results):
     """Draw behavior information on frame"""
@@ -453,42 +1354,32 @@ def generate_summary(results):
 
 def generate_video_summary(results):
     """Generate summary for processed video"""
-    if not results:
-        return {
-            'total_unique_vehicles': 0,
-            'dangerous_vehicles': 0,
-            'risky_vehicles': 0,
-            'safe_vehicles': 0
-        }
-    
-    # Aggregate by vehicle ID
-    vehicle_stats = {}
+    return summarize_vehicle_risks(update_vehicle_risks({}, results))
+
+def update_vehicle_risks(vehicle_risks, results):
+    """Fold results into vehicle_risks, the highest risk level seen per vehicle ID"""
     for result in results:
-        vid = result['id']
-        if vid not in vehicle_stats:
-            vehicle_stats[vid] = {'scores': [], 'risk_levels': []}
-        
-        vehicle_stats[vid]['scores'].append(result['behavior_score'])
-        vehicle_stats[vid]['risk_levels'].append(result['risk_level'])
-    
-    # Calculate statistics
-    dangerous_vehicles = 0
-    risky_vehicles = 0
-    
-    for vid, stats in vehicle_stats.items():
-        max_risk = max(stats['risk_levels'], key=lambda x: ['SAFE', 'RISKY', 'DANGEROUS'].index(x))
-        if max_risk == 'DANGEROUS':
-            dangerous_vehicles += 1
-        elif max_risk == 'RISKY':
-            risky_vehicles += 1
+        risk_rank = RISK_LEVELS.index(result['risk_level'])
+        vehicle_risks[result['id']] = max(vehicle_risks.get(result['id'], 0), risk_rank)
+    return vehicle_risks
+
+def summarize_vehicle_risks(vehicle_risks):
+    """Video summary from the highest risk level seen per vehicle"""
+    dangerous_vehicles = sum(1 for rank in vehicle_risks.values() if RISK_LEVELS[rank] == 'DANGEROUS')
+    risky_vehicles = sum(1 for rank in vehicle_risks.values() if RISK_LEVELS[rank] == 'RISKY')
     
     return {
-        'total_unique_vehicles': len(vehicle_stats),
+        'total_unique_vehicles': len(vehicle_risks),
         'dangerous_vehicles': dangerous_vehicles,
         'risky_vehicles': risky_vehicles,
-        'safe_vehicles': len(vehicle_stats) - dangerous_vehicles - risky_vehicles
+        'safe_vehicles': len(vehicle_risks) - dangerous_vehicles - risky_vehicles
     }
 
+if PRECOMPUTE_SAMPLES:
+    startup.steps.append(('samples', precompute_sample_results))
+# Started only now that every function the steps call is defined
+startup.start()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -11,6 +11,7 @@ import os
 from vehicle_detector import VehicleDetector
 from behavior_analyzer import BehaviorAnalyzer
 from ml_classifier import MLBehaviorClassifier
+from frame_sampler import FrameSampler
 
 app = Flask(__name__)
 CORS(app)
@@ -118,49 +119,36 @@ def process_frame():
 def process_video(video_path):
     """Process entire video file"""
     cap = cv2.VideoCapture(video_path)
-    frame_count = 0
     all_results = []
     
-    while cap.read()[0]:
-        frame_count += 1
-    
-    cap.release()
-    cap = cv2.VideoCapture(video_path)
-    
-    frame_idx = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Process every 10th frame for performance
-        if frame_idx % 10 == 0:
-            detections = detector.detect_vehicles(frame)
-            behaviors = analyzer.analyze_behavior(detections, frame.shape)
-            ml_results = classifier.predict(behaviors)
-            
-            frame_results = []
-            for vehicle_id in behaviors.keys():
-                vehicle_data = behaviors[vehicle_id]
-                ml_data = ml_results.get(vehicle_id, {})
-                
-                frame_results.append({
-                    'frame': frame_idx,
-                    'id': vehicle_id,
-                    'risk_level': vehicle_data['risk_level'],
-                    'behavior_score': vehicle_data['behavior_score'],
-                    'ml_prediction': ml_data.get('prediction', 'UNKNOWN')
-                })
+    # Process every 10th frame for performance; skipped frames are only grabbed
+    sampler = FrameSampler(cap, stride=10)
+    for frame_idx, frame, _ in sampler:
+        detections = detector.detect_vehicles(frame)
+        behaviors = analyzer.analyze_behavior(detections, frame.shape)
+        ml_results = classifier.predict(behaviors)
+        
+        frame_results = []
+        for vehicle_id in behaviors.keys():
+            vehicle_data = behaviors[vehicle_id]
+            ml_data = ml_results.get(vehicle_id, {})
             
-            all_results.extend(frame_results)
+            frame_results.append({
+                'frame': frame_idx,
+                'id': vehicle_id,
+                'risk_level': vehicle_data['risk_level'],
+                'behavior_score': vehicle_data['behavior_score'],
+                'ml_prediction': ml_data.get('prediction', 'UNKNOWN')
+            })
         
-        frame_idx += 1
+        all_results.extend(frame_results)
     
     cap.release()
+    frame_count = sampler.frames_read
     
     return {
         'total_frames': frame_count,
-        'processed_frames': frame_idx // 10,
+        'processed_frames': frame_count // 10,
         'results': all_results,
         'summary': generate_video_summary(all_results)
     }
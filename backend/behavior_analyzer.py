@@ -1,61 +1,201 @@
 import numpy as np
 import math
+import time
 from collections import deque, defaultdict
 
+# Spacing of the grid of frames (0, 10, 20, ...) that vehicles are scored on, which the
+# thresholds, windows and counters were tuned for. Each track is resampled on this grid,
+# interpolating between the frames the vehicle was seen on, so scores do not depend on
+# how often frames are analyzed.
+REFERENCE_FRAME_GAP = 10
+# Analyzed frames a vehicle may go unseen before its history is evicted. The
+# tracker drops lost tracks after 30 frames, so an evicted ID does not come back.
+TRACK_TTL_FRAMES = 60
+
 class BehaviorAnalyzer:
-    def __init__(self, frame_rate=30):
+    def __init__(self, frame_rate=30, track_ttl_frames=TRACK_TTL_FRAMES, track_ttl_seconds=None,
+                 on_track_evicted=None):
+        """Vehicles unseen for track_ttl_frames analyzed frames or track_ttl_seconds are
+        evicted; on_track_evicted, if set, is called with each evicted vehicle's summary."""
         self.frame_rate = frame_rate
+        self.track_ttl_frames = track_ttl_frames
+        self.track_ttl_seconds = track_ttl_seconds
+        self.on_track_evicted = on_track_evicted
+        self.last_frame_idx = None
+        self.frames_analyzed = 0
+        self.track_summaries = {}
         self.vehicle_data = defaultdict(lambda: {
+            # Positions on the REFERENCE_FRAME_GAP grid
             'positions': deque(maxlen=30),
             'speeds': deque(maxlen=10),
             'accelerations': deque(maxlen=5),
             'lane_changes': 0,
             'erratic_movements': 0,
-            'last_lane': None
+            'last_lane': None,
+            # Frame and center the vehicle was last seen at, and its behavior at the last grid frame
+            'last_frame': None,
+            'last_center': None,
+            'behavior': None
         })
+    
+    def reset(self):
+        """Forget all vehicle histories before starting a new video or live session"""
+        self.vehicle_data.clear()
+        self.last_frame_idx = None
+        self.frames_analyzed = 0
+        self.track_summaries = {}
         
-    def analyze_behavior(self, detections, frame_shape):
+    def analyze_behavior(self, detections, frame_shape, frame_idx=None):
+        """Update vehicle histories with one analyzed frame and score each detected vehicle
+        
+        Passing frame_idx lets scores stay comparable when frames are not analyzed at a
+        fixed spacing; without it every call is assumed to be REFERENCE_FRAME_GAP apart.
+        A vehicle's behavior only changes on the frames of the REFERENCE_FRAME_GAP grid;
+        between them it is reported as of the last grid frame.
+        """
+        self._update_frame(frame_idx)
+        behaviors = self._analyze_detections(detections, frame_shape)
+        self._update_track_lifecycle(behaviors, frame_idx)
+        return behaviors
+    
+    def evict_all(self):
+        """Evict every remaining vehicle, e.g. at the end of a video, emitting their summaries"""
+        for vehicle_id in list(self.track_summaries):
+            self._evict(vehicle_id)
+    
+    def active_tracks(self):
+        return len(self.track_summaries)
+    
+    def _analyze_detections(self, detections, frame_shape):
         behaviors = {}
         
         for detection in detections:
             vehicle_id = detection['id']
             center = detection['center']
+            data = self.vehicle_data[vehicle_id]
             
-            # Update position history
-            self.vehicle_data[vehicle_id]['positions'].append(center)
-            
-            # Calculate metrics
-            speed = self._calculate_speed(vehicle_id)
-            acceleration = self._calculate_acceleration(vehicle_id)
-            lane_change = self._detect_lane_change(vehicle_id, frame_shape)
-            erratic = self._detect_erratic_movement(vehicle_id)
+            for grid_center in self._grid_positions(data, center):
+                data['behavior'] = self._analyze_grid_position(vehicle_id, grid_center, frame_shape)
+            data['last_frame'] = self.last_frame_idx
+            data['last_center'] = center
             
-            # Update vehicle data
-            if speed > 0:
-                self.vehicle_data[vehicle_id]['speeds'].append(speed)
-            if acceleration is not None:
-                self.vehicle_data[vehicle_id]['accelerations'].append(acceleration)
-            if lane_change:
-                self.vehicle_data[vehicle_id]['lane_changes'] += 1
-            if erratic:
-                self.vehicle_data[vehicle_id]['erratic_movements'] += 1
-            
-            # Analyze behavior
-            behavior_score = self._calculate_behavior_score(vehicle_id)
-            risk_level = self._classify_risk(behavior_score)
-            
-            behaviors[vehicle_id] = {
-                'speed': speed,
-                'acceleration': acceleration,
-                'lane_changes': self.vehicle_data[vehicle_id]['lane_changes'],
-                'erratic_movements': self.vehicle_data[vehicle_id]['erratic_movements'],
-                'behavior_score': behavior_score,
-                'risk_level': risk_level,
-                'center': center
+            behavior = data['behavior'] or {
+                'speed': 0,
+                'acceleration': None,
+                'lane_changes': 0,
+                'erratic_movements': 0,
+                'behavior_score': 0,
+                'risk_level': self._classify_risk(0)
             }
+            behaviors[vehicle_id] = dict(behavior, center=center)
         
         return behaviors
     
+    def _grid_positions(self, data, center):
+        """Positions of a vehicle, now seen at center, on the grid frames since it was last seen
+        
+        Grid frames between two sightings get positions interpolated between them.
+        """
+        frame = self.last_frame_idx
+        if data['last_frame'] is None:
+            return [center] if frame % REFERENCE_FRAME_GAP == 0 else []
+        
+        last_frame, last_center = data['last_frame'], data['last_center']
+        positions = []
+        grid_frame = (last_frame // REFERENCE_FRAME_GAP + 1) * REFERENCE_FRAME_GAP
+        while grid_frame <= frame:
+            if grid_frame == frame:
+                positions.append(center)
+            else:
+                weight = (grid_frame - last_frame) / (frame - last_frame)
+                positions.append((last_center[0] + weight * (center[0] - last_center[0]),
+                                  last_center[1] + weight * (center[1] - last_center[1])))
+            grid_frame += REFERENCE_FRAME_GAP
+        return positions
+    
+    def _analyze_grid_position(self, vehicle_id, center, frame_shape):
+        """Update a vehicle's history with its position on the next grid frame and score it"""
+        # Update position history
+        self.vehicle_data[vehicle_id]['positions'].append(center)
+        
+        # Calculate metrics
+        speed = self._calculate_speed(vehicle_id)
+        acceleration = self._calculate_acceleration(vehicle_id)
+        lane_change = self._detect_lane_change(vehicle_id, frame_shape)
+        erratic = self._detect_erratic_movement(vehicle_id)
+        
+        # Update vehicle data
+        if speed > 0:
+            self.vehicle_data[vehicle_id]['speeds'].append(speed)
+        if acceleration is not None:
+            self.vehicle_data[vehicle_id]['accelerations'].append(acceleration)
+        if lane_change:
+            self.vehicle_data[vehicle_id]['lane_changes'] += 1
+        if erratic:
+            self.vehicle_data[vehicle_id]['erratic_movements'] += 1
+        
+        # Analyze behavior
+        behavior_score = self._calculate_behavior_score(vehicle_id)
+        risk_level = self._classify_risk(behavior_score)
+        
+        return {
+            'speed': speed,
+            'acceleration': acceleration,
+            'lane_changes': self.vehicle_data[vehicle_id]['lane_changes'],
+            'erratic_movements': self.vehicle_data[vehicle_id]['erratic_movements'],
+            'behavior_score': behavior_score,
+            'risk_level': risk_level
+        }
+    
+    def _update_track_lifecycle(self, behaviors, frame_idx):
+        """Record when each vehicle was seen and evict vehicles that have gone stale"""
+        self.frames_analyzed += 1
+        now = time.time()
+        frame = frame_idx if frame_idx is not None else self.frames_analyzed
+        
+        for vehicle_id, behavior in behaviors.items():
+            summary = self.track_summaries.get(vehicle_id)
+            if summary is None:
+                summary = self.track_summaries[vehicle_id] = {
+                    'id': vehicle_id,
+                    'first_frame': frame,
+                    'observations': 0,
+                    'max_behavior_score': 0
+                }
+            summary['last_frame'] = frame
+            summary['last_seen_analysis'] = self.frames_analyzed
+            summary['last_seen_time'] = now
+            summary['observations'] += 1
+            summary['lane_changes'] = behavior['lane_changes']
+            summary['erratic_movements'] = behavior['erratic_movements']
+            summary['behavior_score'] = behavior['behavior_score']
+            summary['risk_level'] = behavior['risk_level']
+            summary['max_behavior_score'] = max(summary['max_behavior_score'], behavior['behavior_score'])
+        
+        stale = [vehicle_id for vehicle_id, summary in self.track_summaries.items()
+                 if (self.track_ttl_frames is not None
+                     and self.frames_analyzed - summary['last_seen_analysis'] > self.track_ttl_frames)
+                 or (self.track_ttl_seconds is not None
+                     and now - summary['last_seen_time'] > self.track_ttl_seconds)]
+        for vehicle_id in stale:
+            self._evict(vehicle_id)
+    
+    def _evict(self, vehicle_id):
+        summary = self.track_summaries.pop(vehicle_id)
+        self._forget_track(vehicle_id)
+        if self.on_track_evicted is not None:
+            self.on_track_evicted({key: value for key, value in summary.items()
+                                   if key not in ('last_seen_analysis', 'last_seen_time')})
+    
+    def _forget_track(self, vehicle_id):
+        self.vehicle_data.pop(vehicle_id, None)
+    
+    def _update_frame(self, frame_idx):
+        if frame_idx is None:
+            # Without frame numbers, calls are taken to be REFERENCE_FRAME_GAP frames apart
+            frame_idx = 0 if self.last_frame_idx is None else self.last_frame_idx + REFERENCE_FRAME_GAP
+        self.last_frame_idx = frame_idx
+    
     def _calculate_speed(self, vehicle_id):
         positions = self.vehicle_data[vehicle_id]['positions']
         if len(positions) < 2:
@@ -63,7 +203,8 @@ class BehaviorAnalyzer:
         
         # Calculate distance between last two positions
         p1, p2 = positions[-2], positions[-1]
-        distance = math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
+        dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+        distance = math.sqrt(dx * dx + dy * dy)
         
         # Convert to speed (pixels per second)
         speed = distance * self.frame_rate
@@ -151,4 +292,232 @@ class BehaviorAnalyzer:
         elif behavior_score >= 40:
             return 'RISKY'
         else:
-            return 'SAFE'
\ No newline at end of file
+            return 'SAFE'
+
+# History lengths kept per vehicle, matching the deques of BehaviorAnalyzer
+POSITION_HISTORY = 30
+SPEED_HISTORY = 10
+ACCELERATION_HISTORY = 5
+INITIAL_CAPACITY = 64
+
+class VectorizedBehaviorAnalyzer(BehaviorAnalyzer):
+    """BehaviorAnalyzer that scores all vehicles of a frame in one NumPy pass
+    
+    Every track owns a slot in preallocated struct-of-arrays ring buffers
+    (positions, speeds, accelerations, counters), so a grid frame costs a handful of
+    array operations instead of per-vehicle deque copies and norm calls. Results
+    are the same as BehaviorAnalyzer's per-vehicle methods.
+    """
+    
+    def __init__(self, frame_rate=30, **lifecycle_options):
+        super().__init__(frame_rate, **lifecycle_options)
+        self._allocate(INITIAL_CAPACITY)
+    
+    def reset(self):
+        super().reset()
+        self._allocate(INITIAL_CAPACITY)
+    
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.slots = {}
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.positions = np.zeros((capacity, POSITION_HISTORY, 2), dtype=np.float64)
+        self.position_count = np.zeros(capacity, dtype=np.int64)
+        self.speeds = np.zeros((capacity, SPEED_HISTORY), dtype=np.float64)
+        self.speed_count = np.zeros(capacity, dtype=np.int64)
+        self.accelerations = np.zeros((capacity, ACCELERATION_HISTORY), dtype=np.float64)
+        self.acceleration_count = np.zeros(capacity, dtype=np.int64)
+        self.lane_changes = np.zeros(capacity, dtype=np.int64)
+        self.erratic_movements = np.zeros(capacity, dtype=np.int64)
+        # Frame (-1 if none) and center each vehicle was last seen at, and its speed and
+        # acceleration at the last grid frame (NaN if none)
+        self.last_frame = np.full(capacity, -1, dtype=np.int64)
+        self.last_center = np.zeros((capacity, 2), dtype=np.float64)
+        self.last_speed = np.full(capacity, np.nan)
+        self.last_acceleration = np.full(capacity, np.nan)
+    
+    def _grow(self):
+        old_capacity = self.capacity
+        capacity = old_capacity * 2
+        for name, fill in (('positions', 0), ('position_count', 0), ('speeds', 0), ('speed_count', 0),
+                           ('accelerations', 0), ('acceleration_count', 0), ('lane_changes', 0),
+                           ('erratic_movements', 0), ('last_frame', -1), ('last_center', 0),
+                           ('last_speed', np.nan), ('last_acceleration', np.nan)):
+            old = getattr(self, name)
+            grown = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            grown[:old_capacity] = old
+            setattr(self, name, grown)
+        self.capacity = capacity
+        self.free_slots = list(range(capacity - 1, old_capacity - 1, -1)) + self.free_slots
+    
+    def _slot_for(self, vehicle_id):
+        slot = self.slots.get(vehicle_id)
+        if slot is None:
+            if not self.free_slots:
+                self._grow()
+            slot = self.free_slots.pop()
+            self.slots[vehicle_id] = slot
+        return slot
+    
+    def _forget_track(self, vehicle_id):
+        slot = self.slots.pop(vehicle_id, None)
+        if slot is None:
+            return
+        for counts in (self.position_count, self.speed_count, self.acceleration_count,
+                       self.lane_changes, self.erratic_movements):
+            counts[slot] = 0
+        self.last_frame[slot] = -1
+        self.last_speed[slot] = np.nan
+        self.last_acceleration[slot] = np.nan
+        self.free_slots.append(slot)
+    
+    def _analyze_detections(self, detections, frame_shape):
+        if not detections:
+            return {}
+        
+        vehicle_ids = [detection['id'] for detection in detections]
+        if len(set(vehicle_ids)) != len(vehicle_ids):
+            # A track seen twice in one frame must update its history in detection order
+            behaviors = {}
+            for detection in detections:
+                behaviors.update(self._analyze_frame([detection], frame_shape))
+            return behaviors
+        
+        return self._analyze_frame(detections, frame_shape)
+    
+    def _analyze_frame(self, detections, frame_shape):
+        vehicle_ids = [detection['id'] for detection in detections]
+        centers = [detection['center'] for detection in detections]
+        slots = np.array([self._slot_for(vehicle_id) for vehicle_id in vehicle_ids], dtype=np.int64)
+        frame = self.last_frame_idx
+        center_array = np.array(centers, dtype=np.float64)
+        
+        # Grid frames each vehicle passed since it was last seen; a new vehicle only
+        # gets the current frame, if that is on the grid
+        last_frame = self.last_frame[slots]
+        seen = last_frame >= 0
+        ticks = np.where(seen, frame // REFERENCE_FRAME_GAP - last_frame // REFERENCE_FRAME_GAP,
+                         int(frame % REFERENCE_FRAME_GAP == 0))
+        first_grid_frame = np.where(seen, (last_frame // REFERENCE_FRAME_GAP + 1) * REFERENCE_FRAME_GAP, frame)
+        last_center = self.last_center[slots]
+        
+        for tick in range(int(ticks.max(initial=0))):
+            rows = np.nonzero(ticks > tick)[0]
+            grid_frame = first_grid_frame[rows] + tick * REFERENCE_FRAME_GAP
+            # Interpolate between the two sightings the same way BehaviorAnalyzer does
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weight = (grid_frame - last_frame[rows]) / (frame - last_frame[rows])
+            interpolated = last_center[rows] + weight[:, None] * (center_array[rows] - last_center[rows])
+            positions = np.where((grid_frame == frame)[:, None], center_array[rows], interpolated)
+            self._analyze_grid_frame(slots[rows], positions, frame_shape)
+        
+        self.last_frame[slots] = frame
+        self.last_center[slots] = center_array
+        
+        # Analyze behavior
+        scores = self._calculate_behavior_scores(slots)
+        
+        behaviors = {}
+        for i, vehicle_id in enumerate(vehicle_ids):
+            behavior_score = int(scores[i])
+            speed = self.last_speed[slots[i]]
+            acceleration = self.last_acceleration[slots[i]]
+            behaviors[vehicle_id] = {
+                'speed': float(speed) if not np.isnan(speed) else 0,
+                'acceleration': float(acceleration) if not np.isnan(acceleration) else None,
+                'lane_changes': int(self.lane_changes[slots[i]]),
+                'erratic_movements': int(self.erratic_movements[slots[i]]),
+                'behavior_score': behavior_score,
+                'risk_level': self._classify_risk(behavior_score),
+                'center': centers[i]
+            }
+        
+        return behaviors
+    
+    def _analyze_grid_frame(self, slots, centers, frame_shape):
+        """Update the histories of the vehicles in slots with their positions on the next grid frame"""
+        # Update position history
+        self.positions[slots, self.position_count[slots] % POSITION_HISTORY] = centers
+        self.position_count[slots] += 1
+        position_count = self.position_count[slots]
+        
+        # Speed from the last two positions
+        has_speed = position_count >= 2
+        last_two = self._recent(self.positions, slots, position_count, POSITION_HISTORY, 2)
+        delta = last_two[:, 1] - last_two[:, 0]
+        speeds = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]) * self.frame_rate
+        speeds[~has_speed] = 0
+        
+        # Acceleration from the two most recent stored speeds (before this frame's speed)
+        speed_count = self.speed_count[slots]
+        has_acceleration = speed_count >= 2
+        last_speeds = self._recent(self.speeds, slots, speed_count, SPEED_HISTORY, 2)
+        accelerations = (last_speeds[:, 1] - last_speeds[:, 0]) * self.frame_rate
+        
+        # Lane change: variance of the last 10 vertical positions
+        lane_change = np.zeros(len(slots), dtype=bool)
+        lane_rows = np.nonzero(position_count >= 10)[0]
+        if len(lane_rows):
+            recent = self._recent(self.positions, slots[lane_rows], position_count[lane_rows], POSITION_HISTORY, 10)
+            threshold = (frame_shape[0] / 10) ** 2  # Threshold based on frame height
+            lane_change[lane_rows] = np.var(recent[:, :, 1], axis=1) > threshold
+        
+        # Erratic movement: at least two turns sharper than 45 degrees over the last 5 positions
+        erratic = np.zeros(len(slots), dtype=bool)
+        erratic_rows = np.nonzero(position_count >= 5)[0]
+        if len(erratic_rows):
+            recent = self._recent(self.positions, slots[erratic_rows], position_count[erratic_rows], POSITION_HISTORY, 5)
+            vectors = np.diff(recent, axis=1)
+            v1, v2 = vectors[:, :-1], vectors[:, 1:]
+            norm1 = np.sqrt((v1 * v1).sum(axis=2))
+            norm2 = np.sqrt((v2 * v2).sum(axis=2))
+            moving = (norm1 > 0) & (norm2 > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cos_angle = (v1 * v2).sum(axis=2) / (norm1 * norm2)
+            angles = np.arccos(np.clip(np.where(moving, cos_angle, 1.0), -1, 1))
+            direction_changes = (moving & (angles > math.pi / 4)).sum(axis=1)
+            erratic[erratic_rows] = direction_changes >= 2
+        
+        # Update vehicle data
+        self._append(self.speeds, self.speed_count, slots[speeds > 0], speeds[speeds > 0], SPEED_HISTORY)
+        self._append(self.accelerations, self.acceleration_count, slots[has_acceleration],
+                     accelerations[has_acceleration], ACCELERATION_HISTORY)
+        self.lane_changes[slots[lane_change]] += 1
+        self.erratic_movements[slots[erratic]] += 1
+        self.last_speed[slots] = np.where(has_speed, speeds, np.nan)
+        self.last_acceleration[slots] = np.where(has_acceleration, accelerations, np.nan)
+    
+    def _calculate_behavior_scores(self, slots):
+        scores = np.zeros(len(slots), dtype=np.int64)
+        
+        # Speed factor; rows are grouped by history length so each mean sums its
+        # values in the same order as np.mean over the deque does
+        speed_count = np.minimum(self.speed_count[slots], SPEED_HISTORY)
+        for count in np.unique(speed_count[speed_count > 0]):
+            rows = np.nonzero(speed_count == count)[0]
+            recent = self._recent(self.speeds, slots[rows], self.speed_count[slots[rows]], SPEED_HISTORY, count)
+            avg_speed = np.mean(recent, axis=1)
+            scores[rows] += np.where(avg_speed > 100, 30, np.where(avg_speed > 50, 15, 0))
+        
+        # Acceleration factor
+        acceleration_count = np.minimum(self.acceleration_count[slots], ACCELERATION_HISTORY)
+        valid = np.arange(ACCELERATION_HISTORY) < acceleration_count[:, None]
+        max_accel = np.where(valid, np.abs(self.accelerations[slots]), 0).max(axis=1)
+        scores += np.where(max_accel > 50, 25, 0)
+        
+        # Lane changes and erratic movements
+        scores += self.lane_changes[slots] * 20
+        scores += self.erratic_movements[slots] * 15
+        
+        return np.minimum(scores, 100)  # Cap at 100
+    
+    @staticmethod
+    def _recent(buffer, slots, counts, history, n):
+        """Last n entries of each slot's ring buffer in chronological order"""
+        offsets = (counts[:, None] - n + np.arange(n)) % history
+        return buffer[slots[:, None], offsets]
+    
+    @staticmethod
+    def _append(buffer, counts, slots, values, history):
+        buffer[slots, counts[slots] % history] = values
+        counts[slots] += 1
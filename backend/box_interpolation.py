@@ -0,0 +1,143 @@
+INTERPOLATION_MODES = ('none', 'linear', 'velocity')
+
+# Frames held back at most while waiting for the next analyzed frame in 'linear' mode
+MAX_PENDING_FRAMES = 120
+
+
+class BoxInterpolator:
+    """Annotate every frame written to a video from detections on the sampled frames only
+
+    push() takes the frames in order, with the analysis of the sampled ones, and
+    returns the frames that are ready to be written. Sampled frames are drawn from
+    their own detections. In between:
+
+    - 'linear' holds the frames back until the next sampled frame arrives and moves
+      each vehicle's box and center from one sampled position to the next. Vehicles
+      seen on only one side are drawn at that position for the nearer half of the gap.
+    - 'velocity' writes frames straight away and moves each box on at the velocity
+      it had between its last two sampled positions (constant-velocity model).
+    - 'none' leaves them unannotated.
+
+    annotate(frame, detections, results, trails) draws a frame and returns it.
+    Call flush() after the last frame to get the frames still held back.
+    """
+
+    def __init__(self, annotate, mode='linear', max_pending=MAX_PENDING_FRAMES):
+        if mode not in INTERPOLATION_MODES:
+            raise ValueError(f"Unknown interpolation mode '{mode}'. Available: {', '.join(INTERPOLATION_MODES)}")
+        self.annotate = annotate
+        self.mode = mode
+        self.max_pending = max_pending
+        # (frame_idx, tracks) of the last sampled frame; tracks maps id -> (detection, result, trail)
+        self.keyframe = None
+        # Pixels per frame of bbox (x, y, w, h) and center per vehicle, for 'velocity'
+        self.velocities = {}
+        self.gap = 0
+        self.pending = []
+
+    def push(self, frame_idx, frame, analysis=None):
+        ready = []
+        if analysis is None:
+            if self.keyframe is None or self.mode == 'none':
+                ready.append(frame)
+            elif self.mode == 'velocity':
+                ready.append(self._draw_extrapolated(frame_idx, frame))
+            else:
+                self.pending.append((frame_idx, frame))
+                if len(self.pending) > self.max_pending:
+                    ready.append(self._draw_held(*self.pending.pop(0)))
+            return ready
+
+        tracks = self._tracks(analysis)
+        if self.keyframe is not None:
+            previous_idx, previous_tracks = self.keyframe
+            self.gap = frame_idx - previous_idx
+            for pending_idx, pending_frame in self.pending:
+                ready.append(self._draw_between(pending_idx, pending_frame, frame_idx, tracks))
+            if self.mode == 'velocity':
+                self.velocities = {
+                    track_id: (_rate(previous_tracks[track_id][0]['bbox'], detection['bbox'], self.gap),
+                               _rate(previous_tracks[track_id][0]['center'], detection['center'], self.gap))
+                    for track_id, (detection, _, _) in tracks.items() if track_id in previous_tracks
+                }
+        self.pending = []
+        self.keyframe = (frame_idx, tracks)
+        ready.append(self.annotate(frame, analysis['detections'], analysis['results'], analysis.get('trails')))
+        return ready
+
+    def flush(self):
+        ready = [self._draw_held(frame_idx, frame) for frame_idx, frame in self.pending]
+        self.pending = []
+        return ready
+
+    def _tracks(self, analysis):
+        results = {result['id']: result for result in analysis['results']}
+        trails = analysis.get('trails') or {}
+        return {
+            detection['id']: (detection, results.get(detection['id']), trails.get(detection['id'], []))
+            for detection in analysis['detections']
+        }
+
+    def _draw_between(self, frame_idx, frame, next_idx, next_tracks):
+        """Draw a frame between the current keyframe and the one at next_idx"""
+        start_idx, tracks = self.keyframe
+        alpha = (frame_idx - start_idx) / (next_idx - start_idx)
+        boxes = []
+        for track_id, (detection, result, trail) in tracks.items():
+            if track_id in next_tracks:
+                next_detection = next_tracks[track_id][0]
+                boxes.append((detection, result, trail,
+                               _blend(detection['bbox'], next_detection['bbox'], alpha),
+                               _blend(detection['center'], next_detection['center'], alpha)))
+            elif alpha < 0.5:
+                boxes.append((detection, result, trail, detection['bbox'], detection['center']))
+        if alpha >= 0.5:
+            for track_id, (detection, result, trail) in next_tracks.items():
+                if track_id not in tracks:
+                    boxes.append((detection, result, trail, detection['bbox'], detection['center']))
+        return self._draw(frame, boxes)
+
+    def _draw_held(self, frame_idx, frame):
+        """Draw a frame with no later keyframe, holding boxes for half the last gap"""
+        start_idx, tracks = self.keyframe
+        if self.gap and frame_idx - start_idx > self.gap / 2:
+            return frame
+        return self._draw(frame, [(detection, result, trail, detection['bbox'], detection['center'])
+                                  for detection, result, trail in tracks.values()])
+
+    def _draw_extrapolated(self, frame_idx, frame):
+        start_idx, tracks = self.keyframe
+        frames = frame_idx - start_idx
+        boxes = []
+        for track_id, (detection, result, trail) in tracks.items():
+            bbox_rate, center_rate = self.velocities.get(track_id, (None, None))
+            if bbox_rate is None:
+                boxes.append((detection, result, trail, detection['bbox'], detection['center']))
+            else:
+                boxes.append((detection, result, trail, _advance(detection['bbox'], bbox_rate, frames),
+                              _advance(detection['center'], center_rate, frames)))
+        return self._draw(frame, boxes)
+
+    def _draw(self, frame, boxes):
+        """Annotate frame with (detection, result, trail, bbox, center) entries moved to bbox and center"""
+        detections = []
+        results = []
+        trails = {}
+        for detection, result, trail, bbox, center in boxes:
+            detections.append(dict(detection, bbox=bbox, center=center))
+            if result is not None:
+                results.append(dict(result, center=center))
+            trails[detection['id']] = list(trail) + [center]
+        return self.annotate(frame, detections, results, trails)
+
+
+def _blend(start, end, alpha):
+    return tuple(int(round(s + (e - s) * alpha)) for s, e in zip(start, end))
+
+
+def _rate(start, end, frames):
+    return tuple((e - s) / frames for s, e in zip(start, end))
+
+
+def _advance(values, rate, frames):
+    return tuple(int(round(v + r * frames)) for v, r in zip(values, rate))
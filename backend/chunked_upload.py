@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+import cv2
+
+# Bytes copied from the request stream to disk at a time
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadOffsetError(ValueError):
+    """Raised when a chunk does not start where the upload currently ends"""
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class ChunkedUpload:
+    """One resumable upload, written straight to its final file
+
+    Chunks must arrive in order: each one starts at the current offset, which is
+    the number of bytes on disk, so a client that lost a request asks for the
+    offset and resends from there. The SHA-256 of the content is updated as bytes
+    are written; after a server restart it is recomputed from the file.
+    """
+
+    def __init__(self, upload_id, path, filename, size=None, created=None, options=None, max_size=None):
+        self.id = upload_id
+        self.path = path
+        self.filename = filename
+        self.size = size
+        # Limit on the bytes written, whether or not a size was declared
+        self.max_size = max_size
+        # Caller-defined settings kept with the upload, e.g. how to process it
+        self.options = options or {}
+        self.created = created or time.time()
+        self.updated = self.created
+        self.lock = threading.Lock()
+        self.digest = hashlib.sha256()
+        self.hashed_bytes = 0
+        self.completed = False
+        # Set by the app when processing starts before the upload is complete
+        self.job_id = None
+        self.state_changed = threading.Condition()
+
+    @property
+    def offset(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def write_chunk(self, stream, offset, length=None):
+        """Append the bytes of stream, which must start at offset; returns the new offset"""
+        if not self.lock.acquire(blocking=False):
+            raise UploadOffsetError('Another chunk of this upload is being written', self.offset)
+        try:
+            current = self.offset
+            if self.completed:
+                raise UploadOffsetError('Upload is already complete', current)
+            if offset != current:
+                raise UploadOffsetError(f'Chunk starts at {offset} but the upload is at {current}', current)
+            if self.max_size is not None and length is not None and offset + length > self.max_size:
+                raise ValueError(f'Upload is larger than the {self.max_size} byte limit')
+
+            self._catch_up_hash()
+            remaining = length
+            with open(self.path, 'ab') as f:
+                while remaining is None or remaining > 0:
+                    data = stream.read(COPY_CHUNK_SIZE if remaining is None else min(COPY_CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    if self.size is not None and self.hashed_bytes + len(data) > self.size:
+                        raise ValueError(f'Upload is larger than the declared {self.size} bytes')
+                    if self.max_size is not None and self.hashed_bytes + len(data) > self.max_size:
+                        raise ValueError(f'Upload is larger than the {self.max_size} byte limit')
+                    f.write(data)
+                    f.flush()
+                    self.digest.update(data)
+                    self.hashed_bytes += len(data)
+                    if remaining is not None:
+                        remaining -= len(data)
+                    self._notify()
+
+            self.updated = time.time()
+            return self.offset
+        finally:
+            self.lock.release()
+
+    def complete(self, expected_sha256=None):
+        """Mark the upload complete and return its SHA-256, checking it against expected_sha256"""
+        with self.lock:
+            if self.size is not None and self.offset != self.size:
+                raise UploadOffsetError(f'Upload has {self.offset} of {self.size} bytes', self.offset)
+            self._catch_up_hash()
+            sha256 = self.digest.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != sha256:
+                raise ValueError('Uploaded content does not match the expected SHA-256')
+            self.completed = True
+            self.updated = time.time()
+            self._notify()
+            return sha256
+
+    def wait_for_data(self, offset, timeout):
+        """Block until the upload has more than offset bytes or is complete; returns False on timeout"""
+        with self.state_changed:
+            return self.state_changed.wait_for(lambda: self.completed or self.offset > offset, timeout)
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'offset': self.offset,
+            'size': self.size,
+            'completed': self.completed,
+            'job_id': self.job_id
+        }
+
+    def _catch_up_hash(self):
+        """Hash bytes already on disk that the in-memory digest has not seen (e.g. after a restart)"""
+        if self.hashed_bytes == self.offset:
+            return
+        self.digest = hashlib.sha256()
+        self.hashed_bytes = 0
+        with open(self.path, 'rb') as f:
+            for data in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+                self.digest.update(data)
+                self.hashed_bytes += len(data)
+
+    def _notify(self):
+        with self.state_changed:
+            self.state_changed.notify_all()
+
+
+class UploadStore:
+    """Resumable uploads kept in directory, with a small JSON file per upload so they survive restarts
+
+    Uploads that have not received a chunk within expire_after seconds are deleted.
+    """
+
+    def __init__(self, directory='uploads', expire_after=24 * 60 * 60, max_size=None):
+        self.directory = directory
+        self.expire_after = expire_after
+        self.max_size = max_size
+        self.uploads = {}
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, filename, extension, size=None, options=None):
+        if self.max_size is not None and size is not None and size > self.max_size:
+            raise ValueError(f'Upload is larger than the {self.max_size} byte limit')
+        self.expire()
+
+        upload_id = uuid.uuid4().hex
+        upload = ChunkedUpload(upload_id, os.path.join(self.directory, f'{upload_id}.{extension}'), filename, size,
+                               options=options, max_size=self.max_size)
+        open(upload.path, 'wb').close()
+        with open(self._meta_path(upload_id), 'w') as f:
+            json.dump({'path': upload.path, 'filename': filename, 'size': size, 'created': upload.created,
+                       'options': upload.options}, f)
+
+        with self.lock:
+            self.uploads[upload_id] = upload
+        return upload
+
+    def get(self, upload_id):
+        """The upload with upload_id, reloading it from disk after a restart; None if unknown"""
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            return None
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+            if upload is not None:
+                return upload
+
+            meta_path = self._meta_path(upload_id)
+            if not os.path.isfile(meta_path):
+                return None
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            upload = ChunkedUpload(upload_id, meta['path'], meta['filename'], meta['size'], meta['created'],
+                                   meta.get('options'), self.max_size)
+            self.uploads[upload_id] = upload
+            return upload
+
+    def remove(self, upload_id):
+        with self.lock:
+            upload = self.uploads.pop(upload_id, None)
+        if upload is not None:
+            # Let anything still reading the upload run to its end
+            upload.completed = True
+            upload._notify()
+        meta_path = self._meta_path(upload_id)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        if upload is not None and os.path.exists(upload.path):
+            os.remove(upload.path)
+
+    def expire(self):
+        """Delete uploads that have been idle for longer than expire_after"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.upload.json'):
+                continue
+            upload_id = name[:-len('.upload.json')]
+            upload = self.get(upload_id)
+            if upload is None or upload.job_id is not None:
+                continue
+            last_write = max(upload.updated, os.path.getmtime(upload.path) if os.path.exists(upload.path) else 0)
+            if now - last_write > self.expire_after:
+                print(f"Removing abandoned upload {upload_id}")
+                self.remove(upload_id)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.directory, f'{upload_id}.upload.json')
+
+
+class GrowingVideoCapture:
+    """cv2.VideoCapture-like reader for a video that is still being uploaded
+
+    When a read runs into the end of the bytes received so far, it waits for more
+    data, reopens the file and seeks back to the next frame. This only works for
+    containers whose header comes first (AVI, MKV/WebM, MP4 with faststart); the
+    app only starts early once OpenCV can open the partial file.
+    """
+
+    def __init__(self, upload, stall_timeout=30):
+        self.upload = upload
+        self.stall_timeout = stall_timeout
+        self.cap = cv2.VideoCapture(upload.path)
+        self.position = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+        return self.cap.set(prop, value)
+
+    def read(self):
+        return self._next(lambda: self.cap.read())
+
+    def grab(self):
+        return self._next(lambda: self.cap.grab())
+
+    def release(self):
+        self.cap.release()
+
+    def _next(self, step):
+        while True:
+            offset = self.upload.offset
+            result = step()
+            ok = result[0] if isinstance(result, tuple) else result
+            if ok:
+                self.position += 1
+                return result
+            if self.upload.completed and offset == self.upload.offset:
+                return result
+            # Ran out of data: wait for the next chunk and pick up where we stopped
+            if not self.upload.wait_for_data(offset, self.stall_timeout):
+                raise TimeoutError('Upload stalled while processing')
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.upload.path)
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.position)
@@ -0,0 +1,78 @@
+import numpy as np
+
+# sklearn marks leaves with this child index
+TREE_LEAF = -1
+
+
+class CompiledForest:
+    """A fitted StandardScaler + RandomForestClassifier flattened into packed NumPy arrays
+
+    Every node of every tree is stored once in shared feature/threshold/child arrays,
+    with leaves pointing at themselves so that all trees can be walked together for
+    a whole batch: each step moves every (row, tree) pair one level down, and after
+    max_depth steps they all sit on a leaf. Leaf class distributions are normalized
+    up front exactly as sklearn does, so predict_proba returns the same values as
+    the forest while skipping sklearn's per-call validation and per-tree dispatch,
+    which dominate for the handful of rows a live frame produces.
+    """
+
+    def __init__(self, scaler, model):
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.classes_ = model.classes_
+        self.n_trees = len(model.estimators_)
+
+        features, thresholds, left, right, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == TREE_LEAF
+            node_ids = np.arange(tree.node_count) + offset
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            left.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+
+            proba = tree.value[:, 0, :len(self.classes_)].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        self.features = np.concatenate(features).astype(np.intp)
+        self.thresholds = np.concatenate(thresholds)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.values = np.concatenate(values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = max_depth
+
+    def transform(self, X):
+        """Scale X like StandardScaler.transform, then cast like the trees' own input check"""
+        X = np.asarray(X, dtype=np.float64)
+        return ((X - self.mean) / self.scale).astype(np.float32)
+
+    def predict_proba(self, X):
+        """Class probabilities for unscaled feature rows, averaged over trees like sklearn"""
+        X_scaled = self.transform(X)
+        rows = np.arange(len(X_scaled))[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (len(X_scaled), self.n_trees))
+
+        for _ in range(self.max_depth):
+            go_left = X_scaled[rows, self.features[nodes]] <= self.thresholds[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        # Add the trees up one at a time, in the same order sklearn accumulates them
+        tree_values = self.values[nodes]
+        proba = np.zeros((len(X_scaled), len(self.classes_)))
+        for tree_index in range(self.n_trees):
+            proba += tree_values[:, tree_index]
+        return proba / self.n_trees
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
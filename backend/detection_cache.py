@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+# One row per detection; the analyzer only reads ids and centers, so confidence fits in 32 bits
+DETECTION_DTYPE = np.dtype([
+    ('id', '<i4'),
+    ('x', '<i4'), ('y', '<i4'), ('w', '<i4'), ('h', '<i4'),
+    ('center_x', '<i4'), ('center_y', '<i4'),
+    ('confidence', '<f4'),
+    ('class', 'u1')
+])
+
+
+class ReplayMismatchError(ValueError):
+    """Raised when recorded detections do not fit the video they are replayed for"""
+
+
+class DetectionCache:
+    """Disk cache of the raw detections of videos, keyed by video content and detector settings
+
+    Each entry is <key>.npz holding the detections of every tracked frame in one
+    structured array, plus how many of them belong to each frame, in the order
+    the frames were tracked. Replaying an entry (see vehicle_detector.ReplayDetector)
+    lets a video be analyzed again without the detector, e.g. after tuning the
+    analyzer or retraining the classifier. Hits refresh the entry's modification
+    time and the least recently used entries are evicted once the cache grows
+    past max_bytes.
+    """
+
+    def __init__(self, directory='detection_cache', max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, video_hash, config):
+        """Cache key for a video's content hash detected with config (any JSON-serializable settings)"""
+        config_json = json.dumps(config, sort_keys=True)
+        return hashlib.sha256(f'{video_hash}:{config_json}'.encode()).hexdigest()
+
+    def get(self, key):
+        """Detections recorded under key as a list of per-frame detection lists, or None"""
+        path = self._path(key)
+        with self.lock:
+            try:
+                with np.load(path) as entry:
+                    rows = entry['detections']
+                    counts = entry['counts']
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+            os.utime(path)
+            self.hits += 1
+
+        frames = []
+        start = 0
+        for count in counts:
+            frames.append([self._to_detection(row) for row in rows[start:start + count]])
+            start += count
+        return frames
+
+    def put(self, key, frames):
+        """Store the detections of each tracked frame (as returned by detect_vehicles_batch) under key"""
+        counts = np.array([len(detections) for detections in frames], dtype=np.int32)
+        rows = np.array([
+            (d['id'], *d['bbox'], *d['center'], d['confidence'], d['class'])
+            for detections in frames for d in detections
+        ], dtype=DETECTION_DTYPE)
+        with self.lock:
+            # Write to a temporary file first so readers never see a partial entry
+            temp_path = self._path(key) + '.tmp.npz'
+            np.savez_compressed(temp_path, detections=rows, counts=counts)
+            os.replace(temp_path, self._path(key))
+            self._evict()
+
+    def remove(self, key):
+        with self.lock:
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def stats(self):
+        with self.lock:
+            names = os.listdir(self.directory)
+            return {
+                'entries': sum(1 for name in names if not name.endswith('.tmp.npz')),
+                'bytes': sum(os.path.getsize(os.path.join(self.directory, name)) for name in names),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _to_detection(self, row):
+        return {
+            'id': int(row['id']),
+            'bbox': (int(row['x']), int(row['y']), int(row['w']), int(row['h'])),
+            'center': (int(row['center_x']), int(row['center_y'])),
+            'confidence': float(row['confidence']),
+            'class': int(row['class'])
+        }
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            print(f"Evicted cached detections {os.path.basename(path)} ({size} bytes)")
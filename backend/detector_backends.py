@@ -0,0 +1,73 @@
+import hashlib
+import os
+import threading
+
+from ultralytics import YOLO
+
+# 'pytorch' runs the .pt weights directly; the others run a one-time CPU export of them
+DETECTOR_BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+_export_lock = threading.Lock()
+
+
+def exported_model_path(model_path, backend, int8=False):
+    """Where the export of model_path for backend lives, next to the weights"""
+    stem = os.path.splitext(model_path)[0]
+    if backend == 'onnx':
+        return f'{stem}.int8.onnx' if int8 else f'{stem}.onnx'
+    if backend == 'openvino':
+        return f'{stem}_int8_openvino_model' if int8 else f'{stem}_openvino_model'
+    return model_path
+
+
+def prepare_model(model_path='yolov8n.pt', backend='pytorch', int8=False):
+    """Path of the model to load for backend, exporting model_path on first use
+
+    Exports use dynamic input shapes so frames can still be detected in batches.
+    ONNX INT8 models use ONNX Runtime's dynamic quantization: weights are
+    quantized ahead of time and activations at runtime from their observed
+    range, so no calibration data is needed. OpenVINO INT8 goes through the
+    Ultralytics exporter and needs its calibration dataset.
+    """
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{backend}', expected one of {DETECTOR_BACKENDS}")
+    if backend == 'pytorch':
+        return model_path
+
+    target = exported_model_path(model_path, backend, int8)
+    with _export_lock:
+        if os.path.exists(target):
+            return target
+
+        print(f"Exporting {model_path} for the {backend} backend{' (INT8)' if int8 else ''}...")
+        model = YOLO(model_path)
+        if backend == 'onnx':
+            onnx_path = exported_model_path(model_path, 'onnx')
+            if not os.path.exists(onnx_path):
+                onnx_path = model.export(format='onnx', dynamic=True)
+            if int8:
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(onnx_path, target, weight_type=QuantType.QUInt8)
+            else:
+                target = onnx_path
+        else:
+            exported = os.path.normpath(model.export(format='openvino', dynamic=True, int8=int8))
+            if exported != target:
+                os.rename(exported, target)
+
+        print(f"Exported detector model to {target}")
+        return target
+
+
+def load_detection_model(model_path='yolov8n.pt', backend='pytorch', int8=False):
+    """YOLO model for backend; every backend returns the same Results from predict()"""
+    return YOLO(prepare_model(model_path, backend, int8), task='detect')
+
+
+def model_version(model_path='yolov8n.pt', backend='pytorch', int8=False):
+    """Identifies the detections a model produces: a hash of the weights plus the runtime"""
+    version = os.path.basename(model_path)
+    if os.path.exists(model_path):
+        with open(model_path, 'rb') as f:
+            version = f"{version}:{hashlib.sha256(f.read()).hexdigest()[:16]}"
+    return f"{version}:{backend}{'-int8' if int8 else ''}"
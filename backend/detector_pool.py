@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# How often a waiting acquire() re-checks for idle live sessions to reclaim
+EXPIRY_POLL_INTERVAL = 1.0
+
+
+class DetectorBusyError(RuntimeError):
+    """Raised when no detector/analyzer pair becomes free in time"""
+
+
+class AnalysisSession:
+    """A detector/analyzer pair bound to one video or live session at a time"""
+
+    def __init__(self, detector, analyzer):
+        self.detector = detector
+        self.analyzer = analyzer
+        self.session_id = None
+        self.last_used = time.time()
+        self.lock = threading.Lock()
+
+    def reset(self):
+        self.detector.reset()
+        self.analyzer.reset()
+
+
+class DetectorPool:
+    """Fixed set of detector/analyzer pairs so several videos can be tracked concurrently
+
+    Each pair keeps its own tracker and vehicle histories, so a video or live
+    session must hold its pair exclusively and the pair is reset before reuse.
+    The pairs are built on construction, or by fill() when preload is False, e.g.
+    to load the models in the background; acquire() waits for them until then.
+    Analyzers of live pairs also evict vehicles unseen for live_track_ttl_seconds;
+    videos only use the analyzer's frame-based TTL, so their results do not depend
+    on how fast they are processed.
+    """
+
+    def __init__(self, size=2, detector_factory=None, analyzer_factory=None, live_idle_timeout=60, preload=True,
+                 live_track_ttl_seconds=None):
+        self.size = size
+        self.detector_factory = detector_factory
+        self.analyzer_factory = analyzer_factory
+        self.live_idle_timeout = live_idle_timeout
+        self.live_track_ttl_seconds = live_track_ttl_seconds
+        self.idle = queue.Queue()
+        self.live_sessions = {}
+        self.live_lock = threading.Lock()
+        self.filled = 0
+
+        if preload:
+            self.fill()
+
+    def fill(self, prepare=None):
+        """Build the pairs and add them to the pool, calling prepare(session) on each first (e.g. to warm up)"""
+        # Imported here so creating an unfilled pool does not load torch
+        from vehicle_detector import VehicleDetector
+        from behavior_analyzer import BehaviorAnalyzer
+
+        while self.filled < self.size:
+            session = AnalysisSession((self.detector_factory or VehicleDetector)(),
+                                      (self.analyzer_factory or BehaviorAnalyzer)())
+            if prepare is not None:
+                prepare(session)
+            self.idle.put(session)
+            self.filled += 1
+
+    def acquire(self, timeout=None, live=False):
+        """Take a freshly reset pair out of the pool, waiting up to timeout seconds
+
+        Set live for pairs analyzing a live feed rather than a video.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            # Live sessions can go idle while we wait, so keep reclaiming them
+            self._expire_live_sessions()
+            wait = EXPIRY_POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.time(), 0))
+            try:
+                session = self.idle.get(timeout=wait)
+                break
+            except queue.Empty:
+                if deadline is not None and time.time() >= deadline:
+                    raise DetectorBusyError('All detectors are busy. Please try again later.')
+        session.reset()
+        session.analyzer.track_ttl_seconds = self.live_track_ttl_seconds if live else None
+        session.last_used = time.time()
+        return session
+
+    def release(self, session):
+        session.session_id = None
+        self.idle.put(session)
+
+    @contextmanager
+    def session(self, timeout=None):
+        """Hold a pair for the duration of one video"""
+        session = self.acquire(timeout)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    @contextmanager
+    def live_session(self, session_id, timeout=None):
+        """Hold the pair bound to a live session, binding a new one on first use
+
+        Frames of the same live session are serialized on the pair's lock so the
+        tracker always sees them in order.
+        """
+        with self.live_lock:
+            session = self.live_sessions.get(session_id)
+        if session is None:
+            session = self.acquire(timeout, live=True)
+            session.session_id = session_id
+            with self.live_lock:
+                existing = self.live_sessions.setdefault(session_id, session)
+            if existing is not session:
+                # Another request bound this live session first
+                self.release(session)
+                session = existing
+
+        with session.lock:
+            if session.session_id != session_id:
+                raise DetectorBusyError('Live session has ended. Please start a new one.')
+            session.last_used = time.time()
+            yield session
+            session.last_used = time.time()
+
+    def end_live_session(self, session_id):
+        """Return a live session's pair to the pool; returns False if it was not bound"""
+        with self.live_lock:
+            session = self.live_sessions.pop(session_id, None)
+        if session is None:
+            return False
+        with session.lock:
+            self.release(session)
+        return True
+
+    def stats(self):
+        with self.live_lock:
+            live = len(self.live_sessions)
+        return {
+            'size': self.size,
+            'loaded': self.filled,
+            'idle': self.idle.qsize(),
+            'live_sessions': live
+        }
+
+    def _expire_live_sessions(self):
+        """Release live sessions that have not sent a frame within live_idle_timeout"""
+        now = time.time()
+        with self.live_lock:
+            expired = [session_id for session_id, session in self.live_sessions.items()
+                       if not session.lock.locked() and now - session.last_used > self.live_idle_timeout]
+        for session_id in expired:
+            self.end_live_session(session_id)
@@ -0,0 +1,125 @@
+import cv2
+import numpy as np
+
+# Strides at or above this seek instead of grabbing every skipped frame
+SEEK_MIN_STRIDE = 120
+
+# Adaptive sampling defaults
+MIN_STRIDE = 3
+MAX_STRIDE = 30
+# Mean absolute grey-level change (0-255) wanted between two sampled frames
+TARGET_MOTION = 6.0
+# Size of the downscaled greyscale thumbnails used to measure motion
+MOTION_THUMBNAIL_SIZE = (64, 36)
+
+
+class FrameSampler:
+    """Iterate over a video yielding (frame_idx, frame, sampled) for every stride-th frame
+
+    Skipped frames are only grabbed, never retrieved, so they are not converted to
+    BGR or copied. For strides of seek_min_stride or more the reader seeks straight
+    to the next sampled frame instead. When decode_all is set (for example when an
+    annotated video is written) every frame is decoded and yielded, with sampled
+    marking the frames that should be analyzed.
+    """
+
+    def __init__(self, cap, stride=10, decode_all=False, seek_min_stride=SEEK_MIN_STRIDE):
+        self.cap = cap
+        self.stride = max(1, int(stride))
+        self.decode_all = decode_all
+        self.seek_min_stride = seek_min_stride
+        # Number of frames consumed from the video so far (may overshoot the end after a seek)
+        self.frames_read = 0
+        self.next_sample = 0
+        self.sampled_frames = 0
+
+    def __iter__(self):
+        while True:
+            frame_idx = self.frames_read
+            sampled = frame_idx == self.next_sample
+
+            if sampled or self.decode_all:
+                ret, frame = self.cap.read()
+                if not ret:
+                    return
+                self.frames_read += 1
+                if sampled:
+                    self.sampled_frames += 1
+                    self.next_sample = frame_idx + self._next_stride(frame)
+                yield frame_idx, frame, sampled
+            elif not self._skip_to_next_sample():
+                return
+
+    def stats(self):
+        """Sampling settings and the stride actually used, for reporting in results"""
+        return {
+            'mode': 'fixed',
+            'stride': self.stride,
+            'sampled_frames': self.sampled_frames
+        }
+
+    def _next_stride(self, frame):
+        return self.stride
+
+    def _skip_to_next_sample(self):
+        """Advance to the next sampled frame; returns False at the end of the video"""
+        if self.seek_min_stride and self.next_sample - self.frames_read >= self.seek_min_stride:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.next_sample)
+            self.frames_read = self.next_sample
+            return True
+
+        while self.frames_read < self.next_sample:
+            if not self.cap.grab():
+                return False
+            self.frames_read += 1
+        return True
+
+
+class AdaptiveFrameSampler(FrameSampler):
+    """FrameSampler whose stride follows how much the scene is moving
+
+    After each sampled frame the mean absolute difference between downscaled
+    greyscale thumbnails of this and the previous sampled frame is turned into a
+    per-frame motion rate. The next stride is chosen so that roughly target_motion
+    grey levels of change happen between samples, clamped to
+    [min_stride, max_stride] and allowed to at most double or halve per step.
+    Static scenes (a parked car, a red light) drift towards max_stride while fast
+    lane changes pull it down to min_stride.
+    """
+
+    def __init__(self, cap, min_stride=MIN_STRIDE, max_stride=MAX_STRIDE, initial_stride=10,
+                 target_motion=TARGET_MOTION, decode_all=False, seek_min_stride=SEEK_MIN_STRIDE):
+        self.min_stride = max(1, int(min_stride))
+        self.max_stride = max(self.min_stride, int(max_stride))
+        self.target_motion = target_motion
+        initial_stride = min(max(int(initial_stride), self.min_stride), self.max_stride)
+        super().__init__(cap, stride=initial_stride, decode_all=decode_all, seek_min_stride=seek_min_stride)
+        self.previous_thumbnail = None
+        self.stride_total = 0
+
+    def stats(self):
+        return {
+            'mode': 'adaptive',
+            'min_stride': self.min_stride,
+            'max_stride': self.max_stride,
+            'mean_stride': round(self.stride_total / self.sampled_frames, 2) if self.sampled_frames else self.stride,
+            'last_stride': self.stride,
+            'sampled_frames': self.sampled_frames
+        }
+
+    def _next_stride(self, frame):
+        small = cv2.resize(frame, MOTION_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        thumbnail = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+        if self.previous_thumbnail is not None:
+            motion_per_frame = float(np.mean(np.abs(thumbnail - self.previous_thumbnail))) / self.stride
+            if motion_per_frame > 0:
+                wanted = self.target_motion / motion_per_frame
+            else:
+                wanted = self.max_stride
+            wanted = min(max(wanted, self.stride / 2, self.min_stride), self.stride * 2, self.max_stride)
+            self.stride = max(1, int(round(wanted)))
+
+        self.previous_thumbnail = thumbnail
+        self.stride_total += self.stride
+        return self.stride
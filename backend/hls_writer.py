@@ -0,0 +1,92 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+# Target length of each HLS segment
+HLS_SEGMENT_SECONDS = 2
+PLAYLIST_NAME = 'playlist.m3u8'
+INIT_SEGMENT_NAME = 'init.mp4'
+
+
+def find_ffmpeg():
+    """Path of the ffmpeg binary (FFMPEG_BINARY or the one on PATH), or None"""
+    return os.environ.get('FFMPEG_BINARY') or shutil.which('ffmpeg')
+
+
+class HLSVideoWriter:
+    """cv2.VideoWriter-like writer that encodes frames with ffmpeg into fragmented-MP4 HLS segments
+
+    Frames are piped to ffmpeg, which writes H.264 segments of about
+    segment_seconds into directory and lists each one in an 'event' playlist as
+    soon as it is finished, so playback can start while frames are still coming.
+    release() waits for the last segment, which ends the playlist, and joins the
+    init segment and media segments into one fragmented MP4 at output_path.
+    """
+
+    def __init__(self, directory, output_path, fps, frame_size, segment_seconds=HLS_SEGMENT_SECONDS, ffmpeg=None):
+        self.directory = directory
+        self.output_path = output_path
+        self.process = None
+        ffmpeg = ffmpeg or find_ffmpeg()
+        if ffmpeg is None:
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        width, height = frame_size
+        command = [
+            ffmpeg, '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps or 30), '-i', '-',
+            # H.264 in yuv420p needs even dimensions
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+            # Start every segment on a keyframe
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+            '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'event',
+            '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', INIT_SEGMENT_NAME,
+            '-hls_flags', 'independent_segments+temp_file',
+            '-hls_segment_filename', os.path.join(directory, 'segment_%05d.m4s'),
+            os.path.join(directory, PLAYLIST_NAME)
+        ]
+        # stderr goes to a file rather than a pipe nobody reads until release(), which
+        # would block ffmpeg once full
+        self.errors = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.errors)
+        except OSError as e:
+            print(f"Could not start ffmpeg: {e}")
+            self.errors.close()
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    def write(self, frame):
+        if not self.isOpened():
+            return
+        try:
+            self.process.stdin.write(frame.tobytes())
+        except (BrokenPipeError, ValueError):
+            print(f"ffmpeg stopped accepting frames for {self.directory}")
+
+    def release(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        self.process = None
+        self.errors.seek(0)
+        errors = self.errors.read().decode(errors='replace').strip()
+        self.errors.close()
+        if returncode != 0:
+            print(f"ffmpeg failed writing {self.directory}: {errors}")
+            return
+
+        # An init segment followed by its media segments is itself a valid fragmented MP4
+        segments = sorted(name for name in os.listdir(self.directory) if name.endswith('.m4s'))
+        with open(self.output_path, 'wb') as output:
+            for name in [INIT_SEGMENT_NAME] + segments:
+                with open(os.path.join(self.directory, name), 'rb') as segment:
+                    shutil.copyfileobj(segment, output)
@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """State of a single background video processing job"""
+
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.state = 'queued'
+        self.frames_done = 0
+        self.total_frames = 0
+        self.result = None
+        # Outputs usable before the job finishes, e.g. the playlist of a video being written
+        self.output = {}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def update_progress(self, frames_done, total_frames, **output):
+        self.frames_done = frames_done
+        self.total_frames = total_frames
+        self.output.update(output)
+
+    def to_dict(self):
+        progress = 0
+        if self.state == 'completed':
+            progress = 100
+        elif self.total_frames > 0:
+            progress = round(min(self.frames_done / self.total_frames, 1.0) * 100, 1)
+
+        job_data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'state': self.state,
+            'frames_done': self.frames_done,
+            'total_frames': self.total_frames,
+            'progress': progress,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if self.output:
+            job_data['output'] = self.output
+        if self.state == 'completed':
+            job_data['result'] = self.result
+        if self.state == 'failed':
+            job_data['error'] = self.error
+        return job_data
+
+
+class JobQueue:
+    """Bounded worker pool that runs video processing jobs in the background"""
+
+    def __init__(self, max_workers=2, max_pending=16, max_finished=100):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='video-job')
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind, func, *args, cleanup=None, **kwargs):
+        """Queue func(*args, progress_callback=..., **kwargs) and return the new Job
+
+        Raises RuntimeError when max_pending jobs are already waiting for a worker.
+        """
+        with self.lock:
+            pending = sum(1 for job in self.jobs.values() if job.state == 'queued')
+            if pending >= self.max_pending:
+                raise RuntimeError('Too many videos queued for processing. Please try again later.')
+
+            job = Job(str(uuid.uuid4()), kind)
+            self.jobs[job.id] = job
+            self._evict_finished()
+
+        self.executor.submit(self._run, job, func, args, kwargs, cleanup)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+        with self.lock:
+            states = [job.state for job in self.jobs.values()]
+        return {
+            'workers': self.max_workers,
+            'queued': states.count('queued'),
+            'running': states.count('running'),
+            'completed': states.count('completed'),
+            'failed': states.count('failed')
+        }
+
+    def _run(self, job, func, args, kwargs, cleanup):
+        job.state = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = func(*args, progress_callback=job.update_progress, **kwargs)
+            job.state = 'completed'
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.state = 'failed'
+        finally:
+            job.finished_at = time.time()
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    print(f"Job {job.id} cleanup failed: {e}")
+
+    def _evict_finished(self):
+        """Drop the oldest finished jobs once more than max_finished are retained"""
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job.state in ('completed', 'failed')]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
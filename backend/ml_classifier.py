@@ -2,13 +2,50 @@ import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 import joblib
+import copy
+import math
 import os
+import threading
+import uuid
+
+from training_store import TrainingDataStore
+from compiled_forest import CompiledForest
+
+TRAINING_DATA_FILE = 'real_training_data.jsonl'
+# Rows classified per predict_proba call when a whole video is classified at once
+PREDICTION_CHUNK_SIZE = 4096
+# Trees in a model trained from scratch
+N_ESTIMATORS = 100
+# Incremental retraining gives the new samples their share of the forest's trees, within these bounds;
+# when their share needs more trees, the model is retrained from scratch instead
+MIN_NEW_TREES = 5
+MAX_NEW_TREES = 50
+# Forests that would grow beyond this many trees are retrained from scratch, so inference cost stays bounded
+MAX_TREES = 300
+# Fewer new samples than this are not worth retraining on
+MIN_RETRAIN_SAMPLES = 50
+# Trees grown between two progress reports
+TREES_PER_PROGRESS_STEP = 5
 
 class MLBehaviorClassifier:
-    def __init__(self):
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
+    def __init__(self, use_compiled=True):
+        """With use_compiled, inference runs on a CompiledForest built at save_model/load_model"""
+        self.model = RandomForestClassifier(n_estimators=N_ESTIMATORS, random_state=42)
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.use_compiled = use_compiled
+        self.compiled = None
+        # Identifies the trained model, e.g. so cached predictions can be invalidated on retraining
+        self.version = None
+        # Byte offset in the training data file up to which samples were trained on
+        self.trained_offset = None
+        # Number of real samples the forest was trained on, across incremental retrains
+        self.trained_samples = None
+        # Held while retraining; model, scaler and compiled are swapped together under model_lock
+        self.training_lock = threading.Lock()
+        self.model_lock = threading.Lock()
+        self.training_stores = {}
+        self.training_stores_lock = threading.Lock()
         
     def extract_features(self, behavior_data):
         """Extract features from behavior analysis data"""
@@ -28,15 +65,19 @@ class MLBehaviorClassifier:
     
     def train_model(self, training_data=None, use_real_data=True):
         """Train the model with real processed data or synthetic data"""
+        self.trained_offset = None
+        self.trained_samples = None
         if training_data is None:
             if use_real_data:
                 # Try to load real training data from processed videos
-                X, y = self._load_real_training_data()
+                X, y, offset = self._load_real_training_data()
                 if len(X) == 0:
                     print("No real training data available, using synthetic data")
                     X, y = self._generate_synthetic_data()
                 else:
                     print(f"Using {len(X)} real training samples from processed videos")
+                    self.trained_offset = offset
+                    self.trained_samples = len(X)
             else:
                 # Generate synthetic training data
                 X, y = self._generate_synthetic_data()
@@ -49,25 +90,19 @@ class MLBehaviorClassifier:
         # Train model
         self.model.fit(X_scaled, y)
         self.is_trained = True
+        self.compiled = None
+        self.version = uuid.uuid4().hex[:12]
         
         print(f"Model trained with {len(X)} samples")
         return self.model.score(X_scaled, y)
     
     def predict(self, behavior_data):
         """Predict behavior classification"""
-        if not self.is_trained:
-            self.train_model()
-        
         features = self.extract_features(behavior_data)
         if len(features) == 0:
             return {}
         
-        # Scale features
-        features_scaled = self.scaler.transform(features)
-        
-        # Make predictions
-        predictions = self.model.predict(features_scaled)
-        probabilities = self.model.predict_proba(features_scaled)
+        predictions, probabilities = self.predict_features(features)
         
         results = {}
         vehicle_ids = list(behavior_data.keys())
@@ -85,6 +120,133 @@ class MLBehaviorClassifier:
         
         return results
     
+    def predict_features(self, features, chunk_size=None):
+        """Labels and class probabilities for a feature matrix
+        
+        Labels are taken from the predict_proba output, the same way the forest's own
+        predict does, so the trees are only walked once. With chunk_size set, large
+        matrices (e.g. every sampled frame of a video) are classified chunk_size rows
+        at a time.
+        """
+        if not self.is_trained:
+            self.train_model()
+        
+        if len(features) == 0:
+            return np.array([]), np.array([]).reshape(0, len(self.model.classes_))
+        
+        # A retrain may swap the model at any time; use one consistent set
+        with self.model_lock:
+            model, scaler, compiled = self.model, self.scaler, self.compiled
+        if compiled is not None:
+            predict_proba = compiled.predict_proba
+        else:
+            predict_proba = lambda chunk: model.predict_proba(scaler.transform(chunk))
+        
+        step = chunk_size or len(features)
+        probabilities = np.vstack([
+            predict_proba(features[start:start + step])
+            for start in range(0, len(features), step)
+        ])
+        predictions = model.classes_.take(np.argmax(probabilities, axis=1))
+        return predictions, probabilities
+    
+    def retrain(self, full=False, progress_callback=None, filepath=TRAINING_DATA_FILE):
+        """Retrain on the real samples added since the model was trained, while the old model keeps serving
+        
+        New trees are fitted on the new samples only and added to a copy of the
+        forest (warm start), so the cost follows the amount of new data. The new
+        samples get as many trees as their share of all samples trained on, so
+        they carry the same weight as in a full retrain. A full retrain on all
+        samples is done instead when full is set, when the model's training offset
+        is unknown, when the new samples lack one of the model's classes (trees
+        must all predict the same classes), or when their share would need more
+        than MAX_NEW_TREES trees or grow the forest beyond MAX_TREES. The copy
+        replaces the serving model once it is done and is saved.
+        progress_callback(trees_built, trees_total) is called as trees are grown.
+        Raises RuntimeError if a retrain is already running.
+        """
+        if not self.training_lock.acquire(blocking=False):
+            raise RuntimeError('Retraining is already running')
+        try:
+            store = self.get_training_store(filepath)
+            incremental = (not full and self.is_trained and self.trained_offset is not None
+                           and self.trained_samples)
+            if incremental:
+                X, y, end_offset = store.load_since(self.trained_offset)
+                if len(X) < MIN_RETRAIN_SAMPLES:
+                    print(f"Only {len(X)} new training samples, keeping model {self.version}")
+                    return {'mode': 'none', 'new_samples': len(X), 'trees': len(self.model.estimators_),
+                            'version': self.version}
+                if set(np.unique(y)) != set(self.model.classes_):
+                    print(f"New samples only cover {sorted(np.unique(y))}, retraining from scratch")
+                    incremental = False
+                else:
+                    forest_size = len(self.model.estimators_)
+                    new_trees = max(math.ceil(forest_size * len(X) / self.trained_samples), MIN_NEW_TREES)
+                    if new_trees > MAX_NEW_TREES or forest_size + new_trees > MAX_TREES:
+                        print(f"{len(X)} new training samples need {new_trees} more trees, retraining from scratch")
+                        incremental = False
+            
+            if incremental:
+                model = copy.deepcopy(self.model)
+                scaler = self.scaler
+                trained_samples = self.trained_samples + len(X)
+            else:
+                X, y, end_offset = store.load_since(0)
+                if len(X) == 0:
+                    print("No real training data available, using synthetic data")
+                    X, y = self._generate_synthetic_data()
+                    trained_samples = None
+                else:
+                    trained_samples = len(X)
+                model = RandomForestClassifier(n_estimators=0, random_state=42)
+                scaler = StandardScaler().fit(X)
+                new_trees = N_ESTIMATORS
+            
+            X_scaled = scaler.transform(X)
+            start_trees = len(getattr(model, 'estimators_', []))
+            model.warm_start = True
+            built = 0
+            while built < new_trees:
+                built = min(built + TREES_PER_PROGRESS_STEP, new_trees)
+                model.n_estimators = start_trees + built
+                model.fit(X_scaled, y)
+                if progress_callback is not None:
+                    progress_callback(built, new_trees)
+            model.warm_start = False
+            accuracy = model.score(X_scaled, y)
+            
+            compiled = None
+            if self.use_compiled:
+                try:
+                    compiled = CompiledForest(scaler, model)
+                except Exception as e:
+                    print(f"Error compiling model, using sklearn inference: {e}")
+            with self.model_lock:
+                self.model, self.scaler, self.compiled = model, scaler, compiled
+                self.is_trained = True
+                self.version = uuid.uuid4().hex[:12]
+                self.trained_offset = end_offset
+                self.trained_samples = trained_samples
+            self.save_model()
+            
+            mode = 'incremental' if incremental else 'full'
+            print(f"Model {self.version} retrained ({mode}) with {len(X)} samples, {len(model.estimators_)} trees")
+            return {'mode': mode, 'new_samples': len(X), 'trees': len(model.estimators_),
+                    'accuracy': accuracy, 'version': self.version}
+        finally:
+            self.training_lock.release()
+    
+    def compile(self):
+        """Flatten the trained scaler and forest into a CompiledForest for fast inference"""
+        if not self.use_compiled or not self.is_trained:
+            return
+        try:
+            self.compiled = CompiledForest(self.scaler, self.model)
+        except Exception as e:
+            print(f"Error compiling model, using sklearn inference: {e}")
+            self.compiled = None
+    
     def _generate_synthetic_data(self, n_samples=1000):
         """Generate synthetic training data"""
         np.random.seed(42)
@@ -128,54 +290,26 @@ class MLBehaviorClassifier:
         
         return np.array(X), np.array(y)
     
-    def _load_real_training_data(self):
+    def _load_real_training_data(self, filepath=TRAINING_DATA_FILE):
         """Load real training data from processed video results"""
-        training_data_file = 'real_training_data.json'
-        
-        if not os.path.exists(training_data_file):
-            return np.array([]).reshape(0, 5), np.array([])
-        
         try:
-            import json
-            with open(training_data_file, 'r') as f:
-                data = json.load(f)
-            
-            X = []
-            y = []
-            
-            for sample in data:
-                features = [
-                    sample['speed'],
-                    sample['acceleration'],
-                    sample['lane_changes'],
-                    sample['erratic_movements'],
-                    sample['behavior_score']
-                ]
-                X.append(features)
-                y.append(sample['risk_level'])
-            
-            return np.array(X), np.array(y)
-        
+            return self.get_training_store(filepath).load_since(0)
         except Exception as e:
             print(f"Error loading real training data: {e}")
-            return np.array([]).reshape(0, 5), np.array([])
+            return np.array([]).reshape(0, 5), np.array([]), None
     
-    def save_training_data(self, behavior_data, filepath='real_training_data.json'):
-        """Save processed behavior data for training"""
-        import json
-        
-        # Load existing data
-        existing_data = []
-        if os.path.exists(filepath):
-            try:
-                with open(filepath, 'r') as f:
-                    existing_data = json.load(f)
-            except:
-                existing_data = []
-        
-        # Add new data
+    def get_training_store(self, filepath=TRAINING_DATA_FILE):
+        """Shared append-only store for filepath, so concurrent videos append through one buffer"""
+        with self.training_stores_lock:
+            if filepath not in self.training_stores:
+                self.training_stores[filepath] = TrainingDataStore(filepath)
+            return self.training_stores[filepath]
+    
+    def save_training_data(self, behavior_data, filepath=TRAINING_DATA_FILE):
+        """Buffer processed behavior data for training; see flush_training_data"""
+        samples = []
         for vehicle_id, data in behavior_data.items():
-            training_sample = {
+            samples.append({
                 'vehicle_id': vehicle_id,
                 'speed': float(data.get('speed', 0)),
                 'acceleration': float(data.get('acceleration', 0)) if data.get('acceleration') is not None else 0,
@@ -183,14 +317,13 @@ class MLBehaviorClassifier:
                 'erratic_movements': int(data.get('erratic_movements', 0)),
                 'behavior_score': float(data.get('behavior_score', 0)),
                 'risk_level': data.get('risk_level', 'SAFE')
-            }
-            existing_data.append(training_sample)
+            })
         
-        # Save updated data
-        with open(filepath, 'w') as f:
-            json.dump(existing_data, f, indent=2)
-        
-        print(f"Saved {len(behavior_data)} training samples to {filepath}")
+        self.get_training_store(filepath).append(samples)
+    
+    def flush_training_data(self, filepath=TRAINING_DATA_FILE):
+        """Write buffered training samples to disk"""
+        self.get_training_store(filepath).flush()
     
     def save_model(self, filepath='behavior_model.pkl'):
         """Save trained model and scaler"""
@@ -200,9 +333,14 @@ class MLBehaviorClassifier:
         model_data = {
             'model': self.model,
             'scaler': self.scaler,
-            'is_trained': self.is_trained
+            'is_trained': self.is_trained,
+            'version': self.version,
+            'trained_offset': self.trained_offset,
+            'trained_samples': self.trained_samples
         }
         joblib.dump(model_data, filepath)
+        if self.compiled is None:
+            self.compile()
         print(f"Model saved to {filepath}")
     
     def load_model(self, filepath='behavior_model.pkl'):
@@ -213,6 +351,11 @@ class MLBehaviorClassifier:
                 self.model = model_data['model']
                 self.scaler = model_data['scaler']
                 self.is_trained = model_data['is_trained']
+                # Models saved before versioning are identified by their file
+                self.version = model_data.get('version') or f'file-{int(os.path.getmtime(filepath))}'
+                self.trained_offset = model_data.get('trained_offset')
+                self.trained_samples = model_data.get('trained_samples')
+                self.compile()
                 print(f"Model loaded from {filepath}")
                 return True
             except Exception as e:
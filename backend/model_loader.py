@@ -0,0 +1,71 @@
+import threading
+import time
+
+
+class ModelLoader:
+    """Runs the model loading steps on a background thread so the server can start serving first
+
+    steps is a list of (name, function) run in order. The loader is 'pending'
+    until start(), then 'loading', and ends 'ready' once every step has run or
+    'failed' at the first step that raises. status() reports the state and how
+    long each finished step took, for readiness checks.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.state = 'pending'
+        self.current_step = None
+        self.step_seconds = {}
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+        self.thread = None
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def start(self):
+        if self.thread is None:
+            self.started_at = time.time()
+            self.state = 'loading'
+            self.thread = threading.Thread(target=self._run, name='model-loader', daemon=True)
+            self.thread.start()
+
+    def wait(self, timeout=None):
+        """Block until loading finished; raises RuntimeError if it failed or timed out"""
+        if not self.done.wait(timeout):
+            raise RuntimeError('Models are still loading')
+        if self.error is not None:
+            raise RuntimeError(f'Model loading failed: {self.error}')
+
+    def status(self):
+        status = {
+            'state': self.state,
+            'current_step': self.current_step,
+            'steps': self.step_seconds,
+            'error': self.error
+        }
+        if self.started_at is not None:
+            status['seconds'] = round((self.finished_at or time.time()) - self.started_at, 2)
+        return status
+
+    def _run(self):
+        try:
+            for name, step in self.steps:
+                self.current_step = name
+                print(f"Startup: {name}...")
+                step_start = time.time()
+                step()
+                self.step_seconds[name] = round(time.time() - step_start, 2)
+            self.current_step = None
+            self.state = 'ready'
+            print(f"Startup: models ready after {time.time() - self.started_at:.1f}s")
+        except Exception as e:
+            print(f"Startup: {self.current_step} failed: {e}")
+            self.error = str(e)
+            self.state = 'failed'
+        finally:
+            self.finished_at = time.time()
+            self.done.set()
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+# Bytes read at a time while hashing a video
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    """Disk-backed cache of process_video results, keyed by video content and analysis settings
+
+    Each entry is <key>.json holding the result, plus <key><ext> holding the
+    annotated video when one was rendered. Hits refresh the entry's modification
+    time and the least recently used entries are evicted once the cache grows
+    past max_bytes.
+    """
+
+    def __init__(self, directory='result_cache', max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # (path, size, mtime) -> content hash, so unchanged files are only hashed once
+        self.file_hashes = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, video_path, config):
+        """Cache key for a video's content processed with config (any JSON-serializable settings)"""
+        config_json = json.dumps(config, sort_keys=True)
+        return hashlib.sha256(f'{self.file_hash(video_path)}:{config_json}'.encode()).hexdigest()
+
+    def file_hash(self, video_path):
+        stat = os.stat(video_path)
+        identity = (os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+        with self.lock:
+            if identity in self.file_hashes:
+                return self.file_hashes[identity]
+
+        digest = hashlib.sha256()
+        with open(video_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        with self.lock:
+            self.file_hashes[identity] = digest.hexdigest()
+        return digest.hexdigest()
+
+    def remember_hash(self, video_path, sha256):
+        """Record a hash computed elsewhere (e.g. while uploading) so the file is not read again"""
+        stat = os.stat(video_path)
+        with self.lock:
+            self.file_hashes[(os.path.abspath(video_path), stat.st_size, stat.st_mtime)] = sha256
+
+    def get(self, key):
+        """Cached (result, video_path) for key, or None; video_path is None if no video was cached"""
+        result_path = self._result_path(key)
+        with self.lock:
+            try:
+                with open(result_path, 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            video_path = None
+            if entry.get('video_ext'):
+                video_path = os.path.join(self.directory, key + entry['video_ext'])
+                if not os.path.exists(video_path):
+                    # The video went missing; treat the whole entry as stale
+                    self._remove(key)
+                    self.misses += 1
+                    return None
+                os.utime(video_path)
+            os.utime(result_path)
+            self.hits += 1
+            return entry['result'], video_path
+
+    def put(self, key, result, video_path=None):
+        """Store result (and a copy of the annotated video at video_path) under key"""
+        video_ext = os.path.splitext(video_path)[1] if video_path else None
+        with self.lock:
+            if video_path:
+                shutil.copyfile(video_path, os.path.join(self.directory, key + video_ext))
+
+            # Write to a temporary file first so readers never see a partial entry
+            temp_path = self._result_path(key) + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'result': result, 'video_ext': video_ext}, f, default=str)
+            os.replace(temp_path, self._result_path(key))
+            self._evict()
+
+    def stats(self):
+        with self.lock:
+            entries = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+            return {
+                'entries': len(entries),
+                'bytes': self._size(),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _result_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _size(self):
+        return sum(os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory))
+
+    def _remove(self, key):
+        for name in os.listdir(self.directory):
+            if name.startswith(key):
+                os.remove(os.path.join(self.directory, name))
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = {}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            key = name.split('.', 1)[0]
+            size, last_used = entries.get(key, (0, 0))
+            entries[key] = (size + os.path.getsize(path), max(last_used, os.path.getmtime(path)))
+
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+            print(f"Evicted cached result {key} ({size} bytes)")
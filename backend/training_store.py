@@ -0,0 +1,92 @@
+import atexit
+import json
+import os
+import threading
+
+import numpy as np
+
+FEATURE_NAMES = ['speed', 'acceleration', 'lane_changes', 'erratic_movements', 'behavior_score']
+# Samples buffered in memory before they are appended to disk
+FLUSH_EVERY = 500
+
+
+class TrainingDataStore:
+    """Append-only JSON Lines store of per-vehicle training samples
+
+    Each sample is one line, so an append costs the same however large the file
+    gets. Samples are buffered and written FLUSH_EVERY at a time; call flush() when
+    a video is done. A legacy real_training_data.json array next to the store is
+    migrated into it once and renamed to *.migrated.
+    """
+
+    def __init__(self, filepath='real_training_data.jsonl', flush_every=FLUSH_EVERY):
+        self.filepath = filepath
+        self.flush_every = flush_every
+        self.buffer = []
+        self.lock = threading.Lock()
+        self._migrate_legacy_json()
+        # Don't lose a partially filled buffer when the process exits
+        atexit.register(self.flush)
+
+    def append(self, samples):
+        with self.lock:
+            self.buffer.extend(samples)
+            if len(self.buffer) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def load_since(self, offset=0):
+        """Load the samples stored after byte offset; returns (features, labels, end offset)
+
+        Only the new part of the file is read, so callers that remember the end
+        offset (e.g. incremental retraining) pay for new samples only.
+        """
+        with self.lock:
+            self._flush()
+            features = []
+            labels = []
+            end_offset = 0
+            if os.path.exists(self.filepath):
+                with open(self.filepath, 'rb') as f:
+                    f.seek(0, os.SEEK_END)
+                    end_offset = f.tell()
+                    # The file was replaced by a smaller one; start over
+                    if offset > end_offset:
+                        offset = 0
+                    f.seek(offset)
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        sample = json.loads(line)
+                        features.append([sample[name] for name in FEATURE_NAMES])
+                        labels.append(sample['risk_level'])
+
+        if not features:
+            return np.array([]).reshape(0, len(FEATURE_NAMES)), np.array([]), end_offset
+        return np.array(features, dtype=float), np.array(labels), end_offset
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        with open(self.filepath, 'a') as f:
+            f.write(''.join(json.dumps(sample) + '\n' for sample in self.buffer))
+        print(f"Saved {len(self.buffer)} training samples to {self.filepath}")
+        self.buffer = []
+
+    def _migrate_legacy_json(self):
+        legacy_path = os.path.splitext(self.filepath)[0] + '.json'
+        if legacy_path == self.filepath or not os.path.exists(legacy_path):
+            return
+
+        try:
+            with open(legacy_path, 'r') as f:
+                legacy_samples = json.load(f)
+            with open(self.filepath, 'a') as f:
+                f.write(''.join(json.dumps(sample) + '\n' for sample in legacy_samples))
+            os.rename(legacy_path, legacy_path + '.migrated')
+            print(f"Migrated {len(legacy_samples)} training samples from {legacy_path} to {self.filepath}")
+        except Exception as e:
+            print(f"Error migrating legacy training data {legacy_path}: {e}")
@@ -4,46 +4,145 @@ os.environ['TORCH_SERIALIZATION_WEIGHTS_ONLY'] = 'False'
 
 import cv2
 import numpy as np
-from ultralytics import YOLO
+from ultralytics.trackers.bot_sort import BOTSORT
+from ultralytics.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.utils.checks import check_yaml
 from collections import defaultdict, deque
 import math
 
+from detector_backends import load_detection_model, model_version
+
+# Same tracker and confidence that YOLO.track() uses by default; the tracker needs
+# low-confidence boxes for its second association pass
+TRACK_CONFIDENCE = 0.1
+TRACKER_CONFIG = 'botsort.yaml'
+# Tracked frames a track may go unseen before its trail is dropped; longer than the
+# tracker's own 30 frame buffer so a trail is never dropped while its ID can return
+TRACK_TTL_FRAMES = 60
+
 class VehicleDetector:
-    def __init__(self, model_path='yolov8n.pt'):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path='yolov8n.pt', track_ttl_frames=TRACK_TTL_FRAMES, backend='pytorch', int8=False):
+        """backend picks the inference runtime (see detector_backends); tracking is the same for all"""
+        self.model = load_detection_model(model_path, backend, int8)
+        self.backend = backend
+        # Detections differ between weights and runtimes, so recordings are kept per version
+        self.model_version = model_version(model_path, backend, int8)
+        self._init_tracking(track_ttl_frames)
+    
+    def _init_tracking(self, track_ttl_frames):
+        self.tracker = None
         self.track_history = defaultdict(lambda: deque(maxlen=30))
+        self.track_ttl_frames = track_ttl_frames
+        self.frames_tracked = 0
+        self.track_last_seen = {}
         self.vehicle_classes = [2, 3, 5, 7]  # car, motorcycle, bus, truck
+        # Detections of each frame tracked since start_recording, or None when not recording
+        self.recorded_frames = None
+        
+    def detect_vehicles(self, frame, imgsz=None, conf=TRACK_CONFIDENCE, classes=None):
+        return self.detect_vehicles_batch([frame], imgsz, conf, classes)[0]
+    
+    def detect_vehicles_batch(self, frames, imgsz=None, conf=TRACK_CONFIDENCE, classes=None):
+        """Detect vehicles in several frames with one model call, then track them in frame order
+        
+        Batching only changes how inference is dispatched: each frame's boxes go through
+        the same tracker one frame at a time, so the output matches detect_vehicles.
+        Each detection carries its track's 'trail' as of its own frame, since the
+        live history already holds the later frames of the batch.
+        imgsz defaults to the model's input size and classes to self.vehicle_classes.
+        """
+        if not frames:
+            return []
         
-    def detect_vehicles(self, frame):
-        results = self.model.track(frame, persist=True, classes=self.vehicle_classes)
+        options = {'imgsz': imgsz} if imgsz else {}
+        classes = classes if classes is not None else self.vehicle_classes
+        results = self.model.predict(frames, conf=conf, classes=classes, verbose=False, **options)
+        batch_detections = [self._track(result, frame) for result, frame in zip(results, frames)]
+        if self.recorded_frames is not None:
+            self.recorded_frames.extend(batch_detections)
+        return batch_detections
+    
+    def start_recording(self):
+        """Keep the detections of every frame tracked from now on, e.g. for a DetectionCache"""
+        self.recorded_frames = []
+    
+    def stop_recording(self):
+        """Detections of each frame tracked since start_recording, in tracking order"""
+        recorded_frames, self.recorded_frames = self.recorded_frames, None
+        return recorded_frames or []
+    
+    def _get_tracker(self):
+        if self.tracker is None:
+            cfg = IterableSimpleNamespace(**yaml_load(check_yaml(TRACKER_CONFIG)))
+            self.tracker = BOTSORT(args=cfg, frame_rate=30)
+        return self.tracker
+    
+    def _track(self, result, frame):
+        self.frames_tracked += 1
+        self._evict_stale_tracks()
+        boxes = result.boxes.cpu().numpy()
+        if len(boxes) == 0:
+            return []
+        
+        # Each row is x1, y1, x2, y2, track_id, confidence, class, detection index
+        tracks = self._get_tracker().update(boxes, frame)
+        # Boxes that only start new, not yet activated tracks come back as an empty (0,) array
+        if len(tracks) == 0:
+            return []
         detections = []
         
-        if results[0].boxes is not None:
-            boxes = results[0].boxes.xywh.cpu()
-            track_ids = results[0].boxes.id.int().cpu().tolist()
-            confidences = results[0].boxes.conf.float().cpu().tolist()
-            classes = results[0].boxes.cls.int().cpu().tolist()
-            
-            for box, track_id, conf, cls in zip(boxes, track_ids, confidences, classes):
-                x, y, w, h = box
-                detection = {
-                    'id': track_id,
-                    'bbox': (int(x-w/2), int(y-h/2), int(w), int(h)),
-                    'center': (int(x), int(y)),
-                    'confidence': conf,
-                    'class': cls
-                }
-                detections.append(detection)
-                
-                # Store tracking history
-                self.track_history[track_id].append((int(x), int(y)))
+        # Tracker boxes are Kalman estimates and may extend past the frame edges
+        height, width = frame.shape[:2]
+        tracks[:, [0, 2]] = tracks[:, [0, 2]].clip(0, width)
+        tracks[:, [1, 3]] = tracks[:, [1, 3]].clip(0, height)
         
+        for x1, y1, x2, y2, track_id, conf, cls, _ in tracks:
+            x, y, w, h = (x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1
+            track_id = int(track_id)
+            detection = {
+                'id': track_id,
+                'bbox': (int(x-w/2), int(y-h/2), int(w), int(h)),
+                'center': (int(x), int(y)),
+                'confidence': float(conf),
+                'class': int(cls)
+            }
+            detections.append(detection)
+        
+        self._remember_tracks(detections)
         return detections
     
+    def _remember_tracks(self, detections):
+        """Store tracking history, and the trail up to this frame in each detection"""
+        for detection in detections:
+            trail = self.track_history[detection['id']]
+            trail.append(detection['center'])
+            detection['trail'] = list(trail)
+            self.track_last_seen[detection['id']] = self.frames_tracked
+    
+    def _evict_stale_tracks(self):
+        """Drop trails of tracks unseen for more than track_ttl_frames tracked frames"""
+        if self.track_ttl_frames is None:
+            return
+        stale = [track_id for track_id, last_seen in self.track_last_seen.items()
+                 if self.frames_tracked - last_seen > self.track_ttl_frames]
+        for track_id in stale:
+            del self.track_last_seen[track_id]
+            self.track_history.pop(track_id, None)
+    
+    def reset(self):
+        """Forget tracker state and track history before starting a new video or live session"""
+        self.tracker = None
+        self.track_history.clear()
+        self.track_last_seen.clear()
+        self.frames_tracked = 0
+    
     def get_track_history(self, track_id):
-        return list(self.track_history[track_id])
+        return list(self.track_history.get(track_id, []))
     
-    def draw_detections(self, frame, detections):
+    def draw_detections(self, frame, detections, track_history=None):
+        """Draw boxes, IDs and trails; track_history overrides the live history (e.g. a snapshot)"""
+        if track_history is None:
+            track_history = self.track_history
         annotated_frame = frame.copy()
         
         for detection in detections:
@@ -58,9 +157,45 @@ class VehicleDetector:
                        (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
             
             # Draw tracking trail
-            track = self.track_history[track_id]
+            track = track_history.get(track_id, [])
             if len(track) > 1:
                 points = np.array(track, dtype=np.int32).reshape((-1, 1, 2))
                 cv2.polylines(annotated_frame, [points], False, (255, 0, 0), 2)
         
-        return annotated_frame
\ No newline at end of file
+        return annotated_frame
+
+class ReplayDetector(VehicleDetector):
+    """Stands in for a VehicleDetector by replaying the detections it recorded for a video
+
+    recorded_frames holds each tracked frame's detections in tracking order (see
+    DetectionCache), so the video must be sampled exactly as it was when recording.
+    No model is loaded; tracks and their trails are rebuilt frame by frame as the
+    real detector would have, so analysis and annotated videos come out the same.
+    """
+    
+    def __init__(self, recorded_frames, model_version=None, track_ttl_frames=TRACK_TTL_FRAMES):
+        self.model = None
+        self.backend = 'replay'
+        self.model_version = model_version
+        self.replay_frames = recorded_frames
+        self.replay_position = 0
+        self._init_tracking(track_ttl_frames)
+    
+    def detect_vehicles_batch(self, frames, imgsz=None, conf=TRACK_CONFIDENCE, classes=None):
+        """Recorded detections of the next len(frames) frames; the detection options are ignored"""
+        if self.replay_position + len(frames) > len(self.replay_frames):
+            raise ValueError(f"Only {len(self.replay_frames)} frames were recorded")
+        
+        batch_detections = []
+        for _ in frames:
+            detections = self.replay_frames[self.replay_position]
+            self.replay_position += 1
+            self.frames_tracked += 1
+            self._evict_stale_tracks()
+            self._remember_tracks(detections)
+            batch_detections.append(detections)
+        return batch_detections
+    
+    def reset(self):
+        super().reset()
+        self.replay_position = 0
@@ -0,0 +1,126 @@
+import queue
+import threading
+
+# Marks the end of a stage's output
+_END = object()
+# Decoded frames held by the pipeline at once, whatever the stride (about 6 MB each at 1080p)
+MAX_FRAMES_IN_FLIGHT = 64
+
+
+class VideoPipeline:
+    """Run decoding and analysis of a video on their own threads, joined by bounded queues
+
+    The decoder thread reads (frame_idx, frame, sampled) entries from a FrameSampler
+    and groups them into batches holding batch_size sampled frames. The analysis
+    thread passes each batch to analyze_batch, which must return one
+    (frame_idx, frame, analysis) entry per input entry, in order. Iterating over the
+    pipeline yields those entries in frame order, so the caller acts as the final
+    annotate/encode stage while the next batches are being decoded and analyzed.
+
+    At most max_frames decoded frames are held between decoding and the caller,
+    counting the unsampled frames decoded for writing, so memory stays flat no
+    matter how long the video is or how far apart the sampled frames are. A batch
+    is passed on early, with fewer sampled frames, when it would otherwise need
+    more frames than that. An exception in any stage stops the other stages and
+    is re-raised to the caller.
+    """
+
+    def __init__(self, sampler, analyze_batch, batch_size=4, queue_size=2, max_frames=MAX_FRAMES_IN_FLIGHT):
+        self.sampler = sampler
+        self.analyze_batch = analyze_batch
+        self.batch_size = max(1, batch_size)
+        # A slot per frame between decoding and the caller; released once the caller moves on
+        self.frame_slots = threading.Semaphore(max(1, max_frames))
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.analyzed = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.error = None
+
+    def __iter__(self):
+        threads = [
+            threading.Thread(target=self._run_stage, args=(self._decode,), name='pipeline-decode', daemon=True),
+            threading.Thread(target=self._run_stage, args=(self._analyze,), name='pipeline-analyze', daemon=True)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                batch = self._get(self.analyzed)
+                if batch is _END:
+                    break
+                for entry in batch:
+                    yield entry
+                    self.frame_slots.release()
+        finally:
+            # Unblock the other stages if the caller stopped early or a stage failed
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def _run_stage(self, stage):
+        try:
+            stage()
+        except Exception as e:
+            self.error = e
+            self.stop.set()
+
+    def _decode(self):
+        batch = []
+        sampled_count = 0
+        for entry in self.sampler:
+            if self.stop.is_set():
+                return
+            if not self.frame_slots.acquire(blocking=False):
+                # Out of frames: hand on what is decoded so the caller can free some
+                if batch:
+                    self._put(self.decoded, batch)
+                    batch = []
+                    sampled_count = 0
+                if not self._acquire_slot():
+                    return
+            batch.append(entry)
+            if entry[2]:
+                sampled_count += 1
+            if sampled_count >= self.batch_size:
+                self._put(self.decoded, batch)
+                batch = []
+                sampled_count = 0
+
+        if batch:
+            self._put(self.decoded, batch)
+        self._put(self.decoded, _END)
+
+    def _analyze(self):
+        while True:
+            batch = self._get(self.decoded)
+            if batch is _END:
+                break
+            self._put(self.analyzed, self.analyze_batch(batch))
+        self._put(self.analyzed, _END)
+
+    def _acquire_slot(self):
+        while not self.stop.is_set():
+            if self.frame_slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _put(self, stage_queue, item):
+        while not self.stop.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, stage_queue):
+        """Next item from stage_queue, or _END once the pipeline has been stopped"""
+        while True:
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop.is_set():
+                    return _END
@@ -0,0 +1,144 @@
+import os
+import re
+import shutil
+import threading
+import time
+
+# processed_<video_id>.mp4 / .avi, and hls_<video_id>/ segment directories
+_VIDEO_FILE = re.compile(r'processed_(.+)\.(mp4|avi)$')
+_SEGMENT_DIR = re.compile(r'hls_(.+)$')
+
+
+class VideoStorage:
+    """Lifecycle of the annotated videos in directory
+
+    A video is every file belonging to one video_id: the processed .mp4 or .avi
+    and its HLS segment directory. Videos not accessed for ttl seconds are
+    deleted, and once all videos together exceed max_bytes the least recently
+    used ones are deleted as well. Last access is the newest modification time
+    of a video's files; touch() refreshes it when the video is served, so state
+    survives restarts. Videos that are still being written are pinned and never
+    deleted. start() runs sweep() every sweep_interval seconds on a daemon thread.
+    """
+
+    def __init__(self, directory='processed_videos', ttl=2 * 60 * 60, max_bytes=5 * 1024 * 1024 * 1024,
+                 sweep_interval=5 * 60):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.lock = threading.Lock()
+        self.pinned = set()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.removed = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='video-storage-sweeper', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def find(self, video_id):
+        """Path of the processed video file for video_id, or None"""
+        for extension in ('mp4', 'avi'):
+            path = os.path.join(self.directory, f'processed_{video_id}.{extension}')
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def touch(self, video_id):
+        """Mark video_id as just used, restarting its TTL"""
+        for path in self._paths(video_id):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def pin(self, video_id):
+        with self.lock:
+            self.pinned.add(video_id)
+
+    def unpin(self, video_id):
+        with self.lock:
+            self.pinned.discard(video_id)
+
+    def remove(self, video_id):
+        """Delete every file of video_id; returns whether anything was deleted"""
+        paths = self._paths(video_id)
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        return bool(paths)
+
+    def sweep(self):
+        """Delete expired videos, then least recently used ones until under max_bytes"""
+        now = time.time()
+        videos = self._videos()
+        with self.lock:
+            pinned = set(self.pinned)
+
+        total = sum(size for size, _ in videos.values())
+        removed = []
+        for video_id, (size, last_used) in sorted(videos.items(), key=lambda item: item[1][1]):
+            if video_id in pinned:
+                continue
+            if now - last_used > self.ttl or total > self.max_bytes:
+                self.remove(video_id)
+                total -= size
+                removed.append(video_id)
+
+        if removed:
+            self.removed += len(removed)
+            print(f"Removed {len(removed)} processed videos, {total} bytes remain")
+        return removed
+
+    def stats(self):
+        videos = self._videos()
+        return {
+            'videos': len(videos),
+            'bytes': sum(size for size, _ in videos.values()),
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'removed': self.removed
+        }
+
+    def _run(self):
+        while not self.stopped.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Processed video sweep failed: {e}")
+
+    def _paths(self, video_id):
+        names = [f'processed_{video_id}.mp4', f'processed_{video_id}.avi', f'hls_{video_id}']
+        return [os.path.join(self.directory, name) for name in names
+                if os.path.exists(os.path.join(self.directory, name))]
+
+    def _videos(self):
+        """video_id -> (total bytes, last used time) of every video in directory"""
+        videos = {}
+        for name in os.listdir(self.directory):
+            match = _VIDEO_FILE.match(name) or _SEGMENT_DIR.match(name)
+            if match is None:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.isdir(path):
+                    files = [os.path.join(path, child) for child in os.listdir(path)]
+                    size = sum(os.path.getsize(child) for child in files)
+                    last_used = max([os.path.getmtime(path)] + [os.path.getmtime(child) for child in files])
+                else:
+                    size = os.path.getsize(path)
+                    last_used = os.path.getmtime(path)
+            except OSError:
+                # Deleted while listing
+                continue
+            total, newest = videos.get(match.group(1), (0, 0))
+            videos[match.group(1)] = (total + size, max(newest, last_used))
+        return videos
@@ -6,13 +6,14 @@ import Header from './components/layout/Header';
 import Hero from './components/features/Hero';
 import FileUpload from './components/features/FileUpload';
 import ResultsDisplay from './components/features/ResultsDisplay';
-import { VideoAnalysisResult } from './types';
+import { VideoAnalysisResult, JobStatus } from './types';
 import { processSampleVideo } from './utils/api';
 
 function App() {
   const [showDemo, setShowDemo] = useState(false);
   const [analysisResult, setAnalysisResult] = useState<VideoAnalysisResult | null>(null);
   const [isProcessing, setIsProcessing] = useState(false);
+  const [activeJob, setActiveJob] = useState<JobStatus | null>(null);
   const demoRef = useRef<HTMLDivElement>(null);
 
   const handleGetStarted = () => {
@@ -37,6 +38,7 @@ function App() {
   const handleUploadStart = () => {
     setIsProcessing(true);
     setAnalysisResult(null);
+    setActiveJob(null);
   };
 
   const handleNewAnalysis = () => {
@@ -47,9 +49,10 @@ function App() {
   const handleSampleVideoClick = async (videoId: string) => {
     setIsProcessing(true);
     setAnalysisResult(null);
+    setActiveJob(null);
     
     try {
-      const result = await processSampleVideo(videoId);
+      const result = await processSampleVideo(videoId, setActiveJob);
       setAnalysisResult(result);
     } catch (error) {
       console.error('Error processing sample video:', error);
@@ -110,6 +113,7 @@ function App() {
                       <FileUpload
                         onUploadComplete={handleUploadComplete}
                         onUploadStart={handleUploadStart}
+                        onJobUpdate={setActiveJob}
                       />
                     </motion.div>
                   )}
@@ -128,6 +132,9 @@ function App() {
                           <p className="text-gray-600">Analyzing vehicle behavior patterns...</p>
                         </div>
                       </div>
+                      {activeJob?.output?.playlist && (
+                        <ResultsDisplay job={activeJob} className="mt-8 text-left" />
+                      )}
                     </motion.div>
                   )}
 
@@ -5,15 +5,16 @@ import { Upload, File, X, CheckCircle } from 'lucide-react';
 import Button from '../ui/Button';
 import ProgressBar from '../ui/ProgressBar';
 import { uploadVideo } from '../../utils/api';
-import { VideoAnalysisResult, UploadProgress } from '../../types';
+import { VideoAnalysisResult, UploadProgress, JobStatus } from '../../types';
 import toast from 'react-hot-toast';
 
 interface FileUploadProps {
   onUploadComplete: (result: VideoAnalysisResult) => void;
   onUploadStart?: () => void;
+  onJobUpdate?: (job: JobStatus) => void;
 }
 
-const FileUpload: React.FC<FileUploadProps> = ({ onUploadComplete, onUploadStart }) => {
+const FileUpload: React.FC<FileUploadProps> = ({ onUploadComplete, onUploadStart, onJobUpdate }) => {
   const [uploadProgress, setUploadProgress] = useState<UploadProgress | null>(null);
   const [isUploading, setIsUploading] = useState(false);
   const [uploadedFile, setUploadedFile] = useState<File | null>(null);
@@ -41,7 +42,7 @@ const FileUpload: React.FC<FileUploadProps> = ({ onUploadComplete, onUploadStart
     try {
       const result = await uploadVideo(file, (progress) => {
         setUploadProgress(progress);
-      });
+      }, onJobUpdate);
 
       console.log('Upload result:', result);
       console.log('Result type:', typeof result);
@@ -105,7 +106,7 @@ const FileUpload: React.FC<FileUploadProps> = ({ onUploadComplete, onUploadStart
       setIsUploading(false);
       setUploadProgress(null);
     }
-  }, [onUploadComplete, onUploadStart]);
+  }, [onUploadComplete, onUploadStart, onJobUpdate]);
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     onDrop,
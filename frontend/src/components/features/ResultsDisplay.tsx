@@ -3,20 +3,22 @@ import { motion } from 'framer-motion';
 import { AlertTriangle, Shield, Eye, TrendingUp, Car, Video } from 'lucide-react';
 import Card from '../ui/Card';
 import Badge from '../ui/Badge';
-import VideoPlayer from '../ui/VideoPlayer';
+import VideoPlayer, { supportsHls } from '../ui/VideoPlayer';
 import VideoNotice from '../ui/VideoNotice';
-import { VideoAnalysisResult } from '../../types';
+import { VideoAnalysisResult, JobStatus } from '../../types';
 import { cleanupVideo } from '../../utils/api';
 
 interface ResultsDisplayProps {
-  results: VideoAnalysisResult;
+  results?: VideoAnalysisResult;
+  // Job still processing the video; its HLS playlist can be watched before the results are in
+  job?: JobStatus | null;
   className?: string;
 }
 
-const ResultsDisplay: React.FC<ResultsDisplayProps> = ({ results, className = '' }) => {
+const ResultsDisplay: React.FC<ResultsDisplayProps> = ({ results, job, className = '' }) => {
   // Setup video cleanup on component unmount and page leave
   useEffect(() => {
-    const videoId = results.video_id;
+    const videoId = results?.video_id;
     
     if (!videoId) return;
 
@@ -44,7 +46,32 @@ const ResultsDisplay: React.FC<ResultsDisplayProps> = ({ results, className = ''
       window.removeEventListener('beforeunload', handleBeforeUnload);
       handleCleanup();
     };
-  }, [results.video_id]);
+  }, [results?.video_id]);
+
+  // Play the annotated video as its segments are written, while the job is still running
+  const livePlaylist = job?.state === 'running' ? job.output?.playlist : undefined;
+  if (!results && livePlaylist && supportsHls()) {
+    return (
+      <div className={`space-y-6 ${className}`}>
+        <Card className="overflow-hidden">
+          <div className="p-4 bg-gradient-to-r from-blue-50 to-indigo-50 border-b border-gray-200">
+            <h3 className="text-lg font-semibold text-gray-900 flex items-center">
+              <Video className="w-5 h-5 mr-2 text-primary-600" />
+              Processing Video
+            </h3>
+            <p className="text-sm text-gray-600 mt-1">
+              Watch the annotated video while the rest of it is analyzed ({job?.progress ?? 0}% done)
+            </p>
+          </div>
+          <VideoPlayer
+            videoUrl={`${process.env.REACT_APP_API_URL || 'https://mlcba-production.up.railway.app'}${livePlaylist}`}
+            playlistUrl={`${process.env.REACT_APP_API_URL || 'https://mlcba-production.up.railway.app'}${livePlaylist}`}
+            title="Processing..."
+          />
+        </Card>
+      </div>
+    );
+  }
 
   // Add null checks to prevent crashes
   if (!results || !results.summary) {
@@ -96,6 +123,7 @@ const ResultsDisplay: React.FC<ResultsDisplayProps> = ({ results, className = ''
           </div>
           <VideoPlayer
             videoUrl={`${process.env.REACT_APP_API_URL || 'https://mlcba-production.up.railway.app'}/processed_video/${results.video_id}`}
+            playlistUrl={results.playlist && `${process.env.REACT_APP_API_URL || 'https://mlcba-production.up.railway.app'}${results.playlist}`}
             title={results.video_id.startsWith('demo_') ? 'Sample Video' : 'Processed Video Analysis'}
           />
           <VideoNotice className="mt-3" />
@@ -1,20 +1,41 @@
-import React, { useRef, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
+import Hls from 'hls.js';
 import { Play, Pause, Volume2, VolumeX, Maximize, RotateCcw } from 'lucide-react';
 import Card from './Card';
 
 interface VideoPlayerProps {
   videoUrl: string;
+  // HLS playlist, preferred where the browser can play HLS natively or through hls.js
+  playlistUrl?: string;
   className?: string;
   title?: string;
 }
 
-const VideoPlayer: React.FC<VideoPlayerProps> = ({ videoUrl, className = '', title = 'Processed Video' }) => {
+const supportsNativeHls = () =>
+  document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== '';
+
+// Safari plays HLS natively; other browsers play it through hls.js on Media Source Extensions
+export const supportsHls = () => supportsNativeHls() || Hls.isSupported();
+
+const VideoPlayer: React.FC<VideoPlayerProps> = ({ videoUrl, playlistUrl, className = '', title = 'Processed Video' }) => {
   const videoRef = useRef<HTMLVideoElement>(null);
+  const useHlsJs = !!playlistUrl && !supportsNativeHls() && Hls.isSupported();
+  const source = playlistUrl && supportsNativeHls() ? playlistUrl : useHlsJs ? undefined : videoUrl;
   const [isPlaying, setIsPlaying] = useState(false);
   const [isMuted, setIsMuted] = useState(false);
   const [currentTime, setCurrentTime] = useState(0);
   const [duration, setDuration] = useState(0);
 
+  useEffect(() => {
+    if (!useHlsJs || !playlistUrl || !videoRef.current) return;
+
+    // Start from the first segment; a playlist still being written would otherwise start at its live edge
+    const hls = new Hls({ startPosition: 0 });
+    hls.loadSource(playlistUrl);
+    hls.attachMedia(videoRef.current);
+    return () => hls.destroy();
+  }, [useHlsJs, playlistUrl]);
+
   const togglePlay = () => {
     if (!videoRef.current) return;
     
@@ -75,7 +96,7 @@ const VideoPlayer: React.FC<VideoPlayerProps> = ({ videoUrl, className = '', tit
         <div className="relative">
           <video
             ref={videoRef}
-            src={videoUrl}
+            src={source}
             className="w-full h-auto max-h-96 object-contain"
             onTimeUpdate={handleTimeUpdate}
             onLoadedMetadata={handleLoadedMetadata}
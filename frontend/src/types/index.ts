@@ -22,15 +22,73 @@ export interface DetectionSummary {
   alert_level: 'LOW' | 'MEDIUM' | 'HIGH';
 }
 
+export type AnalysisProfileName = 'fast' | 'balanced' | 'accurate';
+
+export interface AnalysisProfile {
+  name: AnalysisProfileName;
+  imgsz: number;
+  conf: number;
+  vehicle_classes: number[];
+  stride: number;
+  min_stride: number;
+  max_stride: number;
+  render: boolean;
+}
+
+export interface OverlayVehicle {
+  id: number;
+  bbox: [number, number, number, number];
+  class: number;
+  trail: Array<[number, number]>;
+  risk_level: 'SAFE' | 'RISKY' | 'DANGEROUS';
+  behavior_score: number;
+  ml_prediction: string;
+  confidence: number;
+}
+
+export interface FrameOverlay {
+  width: number;
+  height: number;
+  vehicles: OverlayVehicle[];
+}
+
 export interface ProcessingResult {
-  annotated_image: string;
+  annotated_image?: string;
   detections: VehicleDetection[];
   summary: DetectionSummary;
+  profile?: AnalysisProfile;
+  overlay?: FrameOverlay;
+}
+
+export interface SamplingStats {
+  mode: 'fixed' | 'adaptive';
+  stride?: number;
+  min_stride?: number;
+  max_stride?: number;
+  mean_stride?: number;
+  last_stride?: number;
+  sampled_frames: number;
+}
+
+export interface VehicleSummary {
+  id: number;
+  first_frame: number;
+  last_frame: number;
+  observations: number;
+  lane_changes: number;
+  erratic_movements: number;
+  behavior_score: number;
+  max_behavior_score: number;
+  risk_level: 'SAFE' | 'RISKY' | 'DANGEROUS';
 }
 
 export interface VideoAnalysisResult {
   total_frames: number;
   processed_frames: number;
+  profile?: AnalysisProfile;
+  sampling?: SamplingStats;
+  vehicles?: VehicleSummary[];
+  cached?: boolean;
   results: Array<{
     frame: number;
     id: number;
@@ -46,6 +104,27 @@ export interface VideoAnalysisResult {
   };
   processed_video_path?: string;
   video_id?: string;
+  // HLS playlist of the annotated video, when it was written as segments
+  playlist?: string;
+}
+
+export interface JobStatus {
+  job_id: string;
+  kind: string;
+  state: 'queued' | 'running' | 'completed' | 'failed';
+  frames_done: number;
+  total_frames: number;
+  progress: number;
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+  result?: VideoAnalysisResult;
+  // Available while the job runs, e.g. the playlist of the video being written
+  output?: {
+    video_id?: string;
+    playlist?: string;
+  };
+  error?: string;
 }
 
 export interface UploadProgress {
@@ -62,4 +141,20 @@ export interface SampleVideo {
   duration: string;
   vehicles: number;
   riskLevel: 'low' | 'medium' | 'high';
-}
\ No newline at end of file
+}
+
+export interface VideoStreamFrame {
+  type: 'frame';
+  frame: number;
+  total_frames: number;
+  results: VideoAnalysisResult['results'];
+}
+
+export type VideoStreamSummary = Omit<VideoAnalysisResult, 'results'> & { type: 'summary' };
+
+export type VideoStreamRecord =
+  | VideoStreamFrame
+  | VideoStreamSummary
+  | { type: 'video'; video_id: string; playlist: string }
+  | { type: 'restart'; reason: string }
+  | { type: 'error'; error: string };
@@ -1,24 +1,71 @@
 import axios from 'axios';
-import { ProcessingResult, VideoAnalysisResult, UploadProgress } from '../types';
+import {
+  ProcessingResult,
+  VideoAnalysisResult,
+  UploadProgress,
+  JobStatus,
+  AnalysisProfileName,
+  VideoStreamFrame,
+  VideoStreamRecord,
+  VideoStreamSummary,
+} from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'https://mlcba-production.up.railway.app';
 
 const api = axios.create({
   baseURL: API_BASE_URL,
-  timeout: 300000, // 5 minutes for video processing
+  timeout: 300000,
 });
 
+const JOB_POLL_INTERVAL_MS = 1000;
+// Job status answers straight away, so a poll that takes longer than this has failed
+const JOB_POLL_TIMEOUT_MS = 30000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+export const getJob = async (jobId: string): Promise<JobStatus> => {
+  const response = await api.get(`/jobs/${jobId}`, { timeout: JOB_POLL_TIMEOUT_MS });
+  return response.data;
+};
+
+// Poll a background processing job until it completes or fails
+export const waitForJob = async (
+  jobId: string,
+  onJobUpdate?: (job: JobStatus) => void
+): Promise<VideoAnalysisResult> => {
+  while (true) {
+    const job = await getJob(jobId);
+    if (onJobUpdate) {
+      onJobUpdate(job);
+    }
+    if (job.state === 'completed' && job.result) {
+      return job.result;
+    }
+    if (job.state === 'failed') {
+      throw new Error(job.error || 'Video processing failed');
+    }
+    await sleep(JOB_POLL_INTERVAL_MS);
+  }
+};
+
 export const uploadVideo = async (
   file: File,
-  onProgress?: (progress: UploadProgress) => void
+  onProgress?: (progress: UploadProgress) => void,
+  onJobUpdate?: (job: JobStatus) => void,
+  profile?: AnalysisProfileName
 ): Promise<VideoAnalysisResult> => {
   const formData = new FormData();
   formData.append('file', file);
+  if (profile) {
+    formData.append('profile', profile);
+  }
 
   const response = await api.post('/upload', formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
     },
+    // Large videos on slow links take as long as they take; progress is reported below
+    timeout: 0,
     onUploadProgress: (progressEvent) => {
       if (onProgress && progressEvent.total) {
         const progress: UploadProgress = {
@@ -43,24 +90,234 @@ export const uploadVideo = async (
     } as any;
   }
   
+  // Processing runs as a background job; poll until the result is ready
+  if (response.status === 202 && response.data.job_id) {
+    return waitForJob(response.data.job_id, onJobUpdate);
+  }
+  
   return response.data;
 };
 
-export const processFrame = async (imageData: string): Promise<ProcessingResult> => {
+// Upload in chunks that can be resumed after a dropped connection, then wait for the job
+export const uploadVideoResumable = async (
+  file: File,
+  onProgress?: (progress: UploadProgress) => void,
+  onJobUpdate?: (job: JobStatus) => void,
+  profile?: AnalysisProfileName,
+  chunkSize: number = 8 * 1024 * 1024,
+  maxRetries: number = 5
+): Promise<VideoAnalysisResult> => {
+  const created = await api.post('/uploads', {
+    filename: file.name,
+    size: file.size,
+    profile,
+    process_early: true,
+  });
+  const uploadId: string = created.data.upload_id;
+
+  let offset = 0;
+  let failures = 0;
+  while (offset < file.size) {
+    try {
+      const response = await api.patch(`/uploads/${uploadId}`, file.slice(offset, offset + chunkSize), {
+        headers: {
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(offset),
+        },
+      });
+      offset = response.data.offset;
+      failures = 0;
+    } catch (error) {
+      if (++failures > maxRetries) {
+        throw error;
+      }
+      // Ask the server how much arrived and carry on from there
+      const status = await api.get(`/uploads/${uploadId}`);
+      offset = status.data.offset;
+    }
+    if (onProgress) {
+      onProgress({
+        loaded: offset,
+        total: file.size,
+        percentage: Math.round((offset * 100) / file.size),
+      });
+    }
+  }
+
+  const completed = await api.post(`/uploads/${uploadId}/complete`);
+  return waitForJob(completed.data.job_id, onJobUpdate);
+};
+
+// Read an NDJSON stream of frame records, resolving with the closing summary record.
+// A restart record means the server is processing the video again from the first frame,
+// so frames received before it should be discarded.
+const readVideoStream = async (
+  response: Response,
+  onFrame?: (frame: VideoStreamFrame) => void,
+  onRestart?: (reason: string) => void
+): Promise<VideoStreamSummary> => {
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || `Streaming failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+    const lines = buffered.split('\n');
+    buffered = lines.pop() || '';
+    for (const line of lines) {
+      if (!line.trim()) {
+        continue;
+      }
+      const record: VideoStreamRecord = JSON.parse(line);
+      if (record.type === 'frame' && onFrame) {
+        onFrame(record);
+      } else if (record.type === 'restart' && onRestart) {
+        onRestart(record.reason);
+      } else if (record.type === 'summary') {
+        return record;
+      } else if (record.type === 'error') {
+        throw new Error(record.error);
+      }
+    }
+
+    if (done) {
+      throw new Error('Stream ended before the video summary');
+    }
+  }
+};
+
+// Upload a video and receive each sampled frame's results as soon as they are computed
+export const uploadVideoStream = async (
+  file: File,
+  onFrame?: (frame: VideoStreamFrame) => void,
+  profile?: AnalysisProfileName,
+  onRestart?: (reason: string) => void
+): Promise<VideoStreamSummary> => {
+  const formData = new FormData();
+  formData.append('file', file);
+  if (profile) {
+    formData.append('profile', profile);
+  }
+
+  const response = await fetch(`${API_BASE_URL}/upload/stream`, { method: 'POST', body: formData });
+  return readVideoStream(response, onFrame, onRestart);
+};
+
+export const processSampleVideoStream = async (
+  videoId: string,
+  onFrame?: (frame: VideoStreamFrame) => void,
+  profile?: AnalysisProfileName,
+  onRestart?: (reason: string) => void
+): Promise<VideoStreamSummary> => {
+  const response = await fetch(`${API_BASE_URL}/process_sample/${videoId}/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(profile ? { profile } : {}),
+  });
+  return readVideoStream(response, onFrame, onRestart);
+};
+
+export const processFrame = async (
+  imageData: string,
+  sessionId?: string,
+  profile?: AnalysisProfileName,
+  mode: 'image' | 'overlay' = 'image'
+): Promise<ProcessingResult> => {
   const response = await api.post('/process_frame', {
     image: imageData,
+    session_id: sessionId,
+    profile,
+    mode,
   });
 
   return response.data;
 };
 
+export interface LiveSocket {
+  sendFrame: (jpeg: Blob) => void;
+  setProfile: (profile: AnalysisProfileName) => void;
+  close: () => void;
+}
+
+// Persistent live session: frames go out as raw JPEG bytes, results come back as JSON,
+// followed by the annotated JPEG when the profile renders
+export const openLiveSocket = (
+  onResult: (result: ProcessingResult & { frame: number }) => void,
+  onAnnotatedFrame?: (jpeg: Blob) => void,
+  profile?: AnalysisProfileName,
+  onError?: (error: string) => void,
+  mode: 'image' | 'overlay' = 'image'
+): LiveSocket => {
+  const url = new URL('/live', API_BASE_URL.replace(/^http/, 'ws'));
+  if (profile) {
+    url.searchParams.set('profile', profile);
+  }
+  url.searchParams.set('mode', mode);
+
+  const socket = new WebSocket(url.toString());
+  socket.binaryType = 'blob';
+  socket.onmessage = (event) => {
+    if (event.data instanceof Blob) {
+      if (onAnnotatedFrame) {
+        onAnnotatedFrame(event.data);
+      }
+      return;
+    }
+    const message = JSON.parse(event.data);
+    if (message.error) {
+      if (onError) {
+        onError(message.error);
+      }
+    } else if (message.detections) {
+      onResult(message);
+    }
+  };
+
+  return {
+    sendFrame: (jpeg: Blob) => {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(jpeg);
+      }
+    },
+    setProfile: (nextProfile: AnalysisProfileName) => {
+      if (socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ profile: nextProfile }));
+      }
+    },
+    close: () => socket.close(),
+  };
+};
+
+export const endLiveSession = async (sessionId: string): Promise<void> => {
+  try {
+    await api.delete(`/end_session/${sessionId}`);
+  } catch (error) {
+    // Silently fail - the session may already have expired
+    console.warn(`Failed to end live session ${sessionId}:`, error);
+  }
+};
+
 export const getSampleVideos = async () => {
   const response = await api.get('/sample_videos');
   return response.data;
 };
 
-export const processSampleVideo = async (videoId: string): Promise<VideoAnalysisResult> => {
-  const response = await api.post(`/process_sample/${videoId}`);
+export const processSampleVideo = async (
+  videoId: string,
+  onJobUpdate?: (job: JobStatus) => void,
+  profile?: AnalysisProfileName
+): Promise<VideoAnalysisResult> => {
+  const response = await api.post(`/process_sample/${videoId}`, profile ? { profile } : undefined);
+  if (response.status === 202 && response.data.job_id) {
+    return waitForJob(response.data.job_id, onJobUpdate);
+  }
   return response.data;
 };
 
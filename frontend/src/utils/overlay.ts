@@ -0,0 +1,46 @@
+import { FrameOverlay } from '../types';
+
+// Same colors the server uses when it annotates frames itself
+const RISK_COLORS: Record<string, string> = {
+  SAFE: 'rgb(0, 255, 0)',
+  RISKY: 'rgb(255, 165, 0)',
+  DANGEROUS: 'rgb(255, 0, 0)',
+};
+
+// Draw the boxes, track trails and risk labels of an overlay response on top of the frame
+// already shown in the canvas; coordinates are scaled from the analyzed frame to the canvas
+export const drawOverlay = (context: CanvasRenderingContext2D, overlay: FrameOverlay) => {
+  const scaleX = context.canvas.width / overlay.width;
+  const scaleY = context.canvas.height / overlay.height;
+
+  overlay.vehicles.forEach((vehicle) => {
+    const [x, y, w, h] = vehicle.bbox;
+    const color = RISK_COLORS[vehicle.risk_level] || RISK_COLORS.SAFE;
+
+    context.strokeStyle = 'rgb(0, 255, 0)';
+    context.lineWidth = 2;
+    context.strokeRect(x * scaleX, y * scaleY, w * scaleX, h * scaleY);
+
+    if (vehicle.trail.length > 1) {
+      context.strokeStyle = 'rgb(0, 0, 255)';
+      context.beginPath();
+      vehicle.trail.forEach(([px, py], index) => {
+        if (index === 0) {
+          context.moveTo(px * scaleX, py * scaleY);
+        } else {
+          context.lineTo(px * scaleX, py * scaleY);
+        }
+      });
+      context.stroke();
+    }
+
+    context.fillStyle = color;
+    context.font = '12px sans-serif';
+    context.fillText(`ID: ${vehicle.id}`, x * scaleX, (y - 10) * scaleY);
+    context.fillText(
+      `${vehicle.risk_level} (${vehicle.confidence}%) Score: ${vehicle.behavior_score}`,
+      x * scaleX,
+      (y - 24) * scaleY
+    );
+  });
+};
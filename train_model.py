@@ -2,101 +2,234 @@
 """
 Script to process dashcam videos and train the ML model with real data
 """
+import hashlib
+import itertools
+import multiprocessing
 import os
+import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 sys.path.append('backend')
 
 from backend.vehicle_detector import VehicleDetector
-from backend.behavior_analyzer import BehaviorAnalyzer
-from backend.ml_classifier import MLBehaviorClassifier
+from backend.behavior_analyzer import VectorizedBehaviorAnalyzer
+from backend.ml_classifier import MLBehaviorClassifier, TRAINING_DATA_FILE
+from backend.frame_sampler import AdaptiveFrameSampler
 import cv2
 
-def process_video_for_training(video_path, detector, analyzer, classifier):
+# Sampled frames sent to the detector in one call
+DETECTION_BATCH_SIZE = 8
+VIDEO_DIR = os.environ.get('TRAINING_VIDEO_DIR', 'backend/sample_videos')
+# Videos processed in parallel, each worker process with its own detector/analyzer; 1 runs in this process
+TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', min(os.cpu_count() or 1, 4)))
+# Samples of each finished video are kept here, so a rerun skips videos that are already done
+CHECKPOINT_DIR = 'training_checkpoints'
+# Set to 1 to discard the checkpoints and process every video again
+TRAINING_RESTART = os.environ.get('TRAINING_RESTART', '0') == '1'
+
+# Detector, analyzer and classifier of a worker process, created once by init_worker
+_worker = {}
+
+def process_video_for_training(video_path, detector, analyzer, classifier, batch_size=DETECTION_BATCH_SIZE,
+                               samples_path=TRAINING_DATA_FILE):
     """Process a video and collect training data"""
     print(f"Processing {os.path.basename(video_path)}...")
-    
+
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"Error: Could not open {video_path}")
         return 0
-    
+
     frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     processed_frames = 0
     training_samples = 0
-    
-    frame_idx = 0
+
+    # Sample more often when the scene moves; skipped frames are only grabbed
+    sampler = AdaptiveFrameSampler(cap)
+    frames = iter(sampler)
     while True:
-        ret, frame = cap.read()
-        if not ret:
+        sampled_frames = list(itertools.islice(frames, batch_size))
+        if not sampled_frames:
             break
-        
-        # Process every 10th frame for performance
-        if frame_idx % 10 == 0:
+
+        try:
+            batch_detections = detector.detect_vehicles_batch([frame for _, frame, _ in sampled_frames])
+        except Exception as e:
+            print(f"  Error detecting frames {sampled_frames[0][0]}-{sampled_frames[-1][0]}: {e}")
+            continue
+
+        for (frame_idx, frame, _), detections in zip(sampled_frames, batch_detections):
             try:
-                detections = detector.detect_vehicles(frame)
-                behaviors = analyzer.analyze_behavior(detections, frame.shape)
-                
+                behaviors = analyzer.analyze_behavior(detections, frame.shape, frame_idx)
+
                 # Save behavior data for training
                 if behaviors:
-                    classifier.save_training_data(behaviors)
+                    classifier.save_training_data(behaviors, samples_path)
                     training_samples += len(behaviors)
-                
+
                 processed_frames += 1
-                
+
                 # Progress indicator
                 if processed_frames % 50 == 0:
                     progress = (frame_idx / frame_count) * 100
-                    print(f"  Progress: {progress:.1f}% - {training_samples} training samples collected")
-                    
+                    print(f"  [{os.path.basename(video_path)}] Progress: {progress:.1f}% - "
+                          f"{training_samples} training samples collected")
+
             except Exception as e:
                 print(f"  Error processing frame {frame_idx}: {e}")
-        
-        frame_idx += 1
-    
+
     cap.release()
-    print(f"  Completed: {processed_frames} frames processed, {training_samples} training samples")
+    classifier.flush_training_data(samples_path)
+    print(f"  Completed {os.path.basename(video_path)}: {processed_frames} frames processed "
+          f"(stride {sampler.stats()['stride']}), {training_samples} training samples")
     return training_samples
 
+def checkpoint_path(video_path):
+    """Samples file of a video, named after the video and its size and modification time"""
+    stat = os.stat(video_path)
+    identity = f'{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime}'
+    digest = hashlib.sha1(identity.encode()).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f'{os.path.basename(video_path)}-{digest}.jsonl')
+
+def init_worker(torch_threads):
+    """Load one detector/analyzer/classifier per worker process"""
+    import torch
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(1)
+    _worker['detector'] = VehicleDetector()
+    _worker['analyzer'] = VectorizedBehaviorAnalyzer()
+    _worker['classifier'] = MLBehaviorClassifier()
+
+def collect_video(video_path):
+    """Worker task: collect a video's samples into its checkpoint file
+
+    Samples are written to a partial file that is renamed once the video is done,
+    so a crash leaves no checkpoint and the video is processed again on the next run.
+    """
+    if not _worker:
+        init_worker(torch_threads=os.cpu_count() or 1)
+    final_path = checkpoint_path(video_path)
+    partial_path = final_path[:-len('.jsonl')] + '.partial.jsonl'
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    # Tracking state must not carry over from the previous video of this worker
+    _worker['detector'].reset()
+    _worker['analyzer'].reset()
+    samples = process_video_for_training(video_path, _worker['detector'], _worker['analyzer'],
+                                         _worker['classifier'], samples_path=partial_path)
+    _worker['classifier'].training_stores.pop(partial_path, None)
+    if os.path.exists(partial_path):
+        os.replace(partial_path, final_path)
+    else:
+        # No samples, but the video is still done
+        open(final_path, 'w').close()
+    return samples
+
+def collect_training_data(video_files, workers=TRAINING_WORKERS):
+    """Process the videos without a checkpoint, in parallel worker processes when workers > 1
+
+    Returns the number of samples collected in this run.
+    """
+    pending = [video for video in video_files if not os.path.exists(checkpoint_path(video))]
+    skipped = len(video_files) - len(pending)
+    if skipped:
+        print(f"⏭️  Skipping {skipped} videos already processed (checkpoints in {CHECKPOINT_DIR}/)")
+    if not pending:
+        return 0
+
+    workers = max(1, min(workers, len(pending)))
+    if workers == 1:
+        return sum(collect_video(video) for video in pending)
+
+    print(f"Using {workers} worker processes")
+    total_samples = 0
+    # Spawned workers each load their own models; split the cores between them
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(torch_threads,)) as executor:
+        futures = {executor.submit(collect_video, video): video for video in pending}
+        for future in as_completed(futures):
+            try:
+                total_samples += future.result()
+            except Exception as e:
+                print(f"❌ Error processing {os.path.basename(futures[future])}: {e}")
+    return total_samples
+
+def merge_checkpoints(video_files, training_data_file=TRAINING_DATA_FILE):
+    """Append the samples of finished videos not merged yet to the training data; returns samples merged
+
+    Before a checkpoint is appended, the size of the training data is written to
+    a '.merging' marker, which is renamed to '.merged' once the samples are on disk.
+    A merge that was interrupted in between is redone from the recorded size, so
+    its samples are neither lost nor duplicated. Nothing else may append to the
+    training data while checkpoints are merged.
+    """
+    merged_samples = 0
+    with open(training_data_file, 'ab') as training_data:
+        for video_path in video_files:
+            samples_path = checkpoint_path(video_path)
+            merged_marker = samples_path + '.merged'
+            merging_marker = samples_path + '.merging'
+            if not os.path.exists(samples_path) or os.path.exists(merged_marker):
+                continue
+            if os.path.exists(merging_marker):
+                # A previous run stopped part way through appending this checkpoint
+                with open(merging_marker, 'r') as marker:
+                    training_data.truncate(int(marker.read()))
+            else:
+                # Written to a temporary file and renamed, so the marker is never half written
+                with open(merging_marker + '.tmp', 'w') as marker:
+                    marker.write(str(training_data.tell()))
+                    marker.flush()
+                    os.fsync(marker.fileno())
+                os.replace(merging_marker + '.tmp', merging_marker)
+            with open(samples_path, 'rb') as samples:
+                data = samples.read()
+            training_data.write(data)
+            training_data.flush()
+            os.fsync(training_data.fileno())
+            os.replace(merging_marker, merged_marker)
+            merged_samples += len(data.splitlines())
+    return merged_samples
+
 def main():
     print("🚗 Vehicle Behavior Model Training")
     print("=" * 50)
-    
-    # Initialize components
-    print("Initializing AI components...")
-    detector = VehicleDetector()
-    analyzer = BehaviorAnalyzer()
-    classifier = MLBehaviorClassifier()
-    
-    # Find all video files in sample_videos directory
-    video_dir = "backend/sample_videos"
+
+    # Find all video files in the video directory
     video_extensions = ('.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.MP4', '.AVI', '.MOV')
-    
+
     video_files = []
-    for file in os.listdir(video_dir):
+    for file in sorted(os.listdir(VIDEO_DIR)):
         if file.endswith(video_extensions) and not file.startswith('.'):
-            video_files.append(os.path.join(video_dir, file))
-    
+            video_files.append(os.path.join(VIDEO_DIR, file))
+
     if not video_files:
-        print("❌ No video files found in backend/sample_videos/")
+        print(f"❌ No video files found in {VIDEO_DIR}/")
         return
-    
+
     print(f"📹 Found {len(video_files)} video files:")
     for video in video_files:
         print(f"  - {os.path.basename(video)}")
-    
+
+    if TRAINING_RESTART:
+        shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+
     print("\n🔄 Processing videos to collect training data...")
-    
-    total_samples = 0
-    for video_path in video_files:
-        samples = process_video_for_training(video_path, detector, analyzer, classifier)
-        total_samples += samples
-    
+    collected_samples = collect_training_data(video_files)
+
+    # Only train once every worker is done
+    total_samples = merge_checkpoints(video_files)
+
     print(f"\n✅ Data collection complete!")
-    print(f"📊 Total training samples collected: {total_samples}")
-    
+    print(f"📊 Training samples collected in this run: {collected_samples}, added to {TRAINING_DATA_FILE}: {total_samples}")
+
     if total_samples > 0:
         print("\n🤖 Training ML model with real data...")
         try:
+            classifier = MLBehaviorClassifier()
             accuracy = classifier.train_model(use_real_data=True)
             classifier.save_model()
             print(f"✅ Model trained successfully!")
@@ -105,9 +238,9 @@ def main():
         except Exception as e:
             print(f"❌ Error training model: {e}")
     else:
-        print("⚠️  No training data collected. Check your videos and try again.")
-    
+        print("⚠️  No new training data collected. Check your videos and try again.")
+
     print("\n🎉 Training complete! Your model is ready to use.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
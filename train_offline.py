@@ -7,6 +7,19 @@ import json
 import os
 import time
 
+def wait_for_job(base_url, response):
+    """Result of a queued job (202 response), polling until it finishes; other responses are returned as is"""
+    if response.status_code != 202:
+        return response.status_code, response.json()
+    job_id = response.json()['job_id']
+    while True:
+        job = requests.get(f"{base_url}/jobs/{job_id}").json()
+        if job['state'] == 'completed':
+            return 200, job['result']
+        if job['state'] == 'failed':
+            return 500, job
+        time.sleep(1)
+
 def train_model_with_videos():
     base_url = "http://localhost:5000"
     
@@ -39,9 +52,8 @@ def train_model_with_videos():
     for video in videos:
         print(f"\n🔄 Processing {video['name']}...")
         try:
-            response = requests.post(f"{base_url}/process_sample/{video['id']}")
-            if response.status_code == 200:
-                result = response.json()
+            status, result = wait_for_job(base_url, requests.post(f"{base_url}/process_sample/{video['id']}"))
+            if status == 200:
                 processed = result.get('processed_frames', 0)
                 total_processed += processed
                 print(f"✅ Processed {processed} frames")
@@ -53,7 +65,7 @@ def train_model_with_videos():
                 print(f"   Risky: {summary.get('risky_vehicles', 0)}")
                 print(f"   Dangerous: {summary.get('dangerous_vehicles', 0)}")
             else:
-                print(f"❌ Error processing {video['name']}: {response.text}")
+                print(f"❌ Error processing {video['name']}: {result}")
         except Exception as e:
             print(f"❌ Error processing {video['name']}: {e}")
         
@@ -62,13 +74,12 @@ def train_model_with_videos():
     if total_processed > 0:
         print(f"\n🤖 Retraining model with collected data...")
         try:
-            response = requests.post(f"{base_url}/retrain_model")
-            if response.status_code == 200:
-                result = response.json()
-                print("✅ Model retrained successfully!")
+            status, result = wait_for_job(base_url, requests.post(f"{base_url}/retrain_model"))
+            if status == 200:
+                print(f"✅ Model retrained successfully! ({result.get('mode')}, {result.get('new_samples', 0)} new samples)")
                 print(f"📈 Accuracy: {result.get('accuracy', 0):.2%}")
             else:
-                print(f"❌ Error retraining model: {response.text}")
+                print(f"❌ Error retraining model: {result}")
         except Exception as e:
             print(f"❌ Error retraining model: {e}")
     